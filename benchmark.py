@@ -0,0 +1,174 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    "noita": "divide-by-noita-way.py",
+    "div1": "divide-by-min-spaces-with-div1.py",
+}
+
+# Targets per size for the full searches, and the largest inner target for find_best_groups
+DECOMPOSITION_TARGETS = {
+    "small": range(5, 301, 5),
+    "medium": range(1000, 5001, 500),
+    "large": range(20000, 100001, 40000),
+}
+# Targets for the sharded search (find_best_decomposition(workers=PARALLEL_WORKERS)), noita only
+PARALLEL_TARGETS = range(20000, 100001, 40000)
+PARALLEL_WORKERS = 2
+GROUP_TARGETS = {
+    "small": 1000,
+    "medium": 10000,
+    "large": 50000,
+}
+
+DEFAULT_BASELINE = os.path.join(HERE, "benchmark-baseline.json")
+
+def load_script(name):
+    """
+    Import one of the scripts by path (their file names aren't valid module
+    names). The module is registered in sys.modules so worker processes can
+    find its functions by name.
+    """
+    path = os.path.join(HERE, SCRIPTS[name])
+    spec = importlib.util.spec_from_file_location("divide_by_" + name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def bench_generate_all_products(module):
+    for _ in range(20):
+        module.generate_all_products(800)
+
+def bench_find_best_groups(module, hi):
+    products = module.load_products()
+    table = module.build_group_table(hi, products)
+    for target in range(hi + 1):
+        module.find_best_groups(target, products, table)
+
+def bench_find_best_decomposition(module, targets, workers=1):
+    for target in targets:
+        if workers > 1:
+            module.find_best_decomposition(target, workers=workers)
+        else:
+            module.find_best_decomposition(target)
+
+def benchmarks(names=None):
+    """
+    Every benchmark as (name, script, function taking the loaded script),
+    optionally only those whose name contains one of names
+    """
+    cases = []
+    for script in SCRIPTS:
+        cases.append((f"{script}/generate_all_products", script, bench_generate_all_products))
+        for size, hi in GROUP_TARGETS.items():
+            cases.append((f"{script}/find_best_groups/{size}", script,
+                          lambda module, hi=hi: bench_find_best_groups(module, hi)))
+        for size, targets in DECOMPOSITION_TARGETS.items():
+            cases.append((f"{script}/find_best_decomposition/{size}", script,
+                          lambda module, targets=targets: bench_find_best_decomposition(module, targets)))
+    cases.append(("noita/find_best_decomposition/parallel", "noita",
+                  lambda module: bench_find_best_decomposition(module, PARALLEL_TARGETS, PARALLEL_WORKERS)))
+    if names:
+        cases = [case for case in cases if any(name in case[0] for name in names)]
+    return cases
+
+def measure(module, function, repeat):
+    """
+    Run one benchmark repeat times (after loading the shared catalog)
+    Returns: {"seconds": best wall time, "peak_bytes": traced peak, "dp_cells": DP cells filled per run}
+    """
+    module.load_products()
+    
+    seconds = float('inf')
+    cells = 0
+    for _ in range(repeat):
+        before = module.RULES.dp_cells_evaluated
+        start = time.perf_counter()
+        function(module)
+        seconds = min(seconds, time.perf_counter() - start)
+        cells = module.RULES.dp_cells_evaluated - before
+    
+    # A separate run for memory, tracing slows the timed runs down
+    tracemalloc.start()
+    function(module)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {"seconds": round(seconds, 6), "peak_bytes": peak, "dp_cells": cells}
+
+def run(names=None, repeat=3):
+    """Returns: {benchmark name: measurements}"""
+    modules = {}
+    results = {}
+    for name, script, function in benchmarks(names):
+        if script not in modules:
+            modules[script] = load_script(script)
+        results[name] = measure(modules[script], function, repeat)
+        print(f"{name:45} {results[name]['seconds']:10.4f}s {results[name]['peak_bytes'] / 1e6:9.2f} MB "
+              f"{results[name]['dp_cells']:12d} cells", flush=True)
+    return results
+
+def compare(results, baseline, threshold):
+    """
+    Regressions against a baseline: a metric more than threshold (a fraction)
+    above its baseline value. Wall times within 5 ms of the baseline never count,
+    they're below timer noise.
+    Returns: list of (name, metric, baseline value, current value)
+    """
+    regressions = []
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in current.items():
+            limit = baseline[name][metric] * (1 + threshold)
+            if metric == "seconds":
+                limit = max(limit, baseline[name][metric] + 0.005)
+            if value > limit:
+                regressions.append((name, metric, baseline[name][metric], value))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the divide-by engines against a JSON baseline")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown / growth before failing, as a fraction (default 0.25)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark, the best counts")
+    args = parser.parse_args()
+    
+    results = run(args.names, args.repeat)
+    
+    if args.save:
+        document = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+        if os.path.exists(args.baseline) and args.names:
+            # Only refresh the benchmarks that were run
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            previous["results"].update(results)
+            document["results"] = previous["results"]
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+    
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save first")
+        sys.exit(0)
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name} {metric}: {before} -> {after}")
+    print(f"{len(regressions)} regressions (threshold {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
@@ -1,3 +1,91 @@
+import asyncio
+import csv
+import heapq
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from divide_by_rules import NOITA_RULES, divisors
+
+# Combo rules (draw cancel positions, overflow caps), compiled into a lookup
+# table over all 340 sequences; edit them in divide_by_rules.py
+RULES = NOITA_RULES
+RULES_VERSION = RULES.version
+
+# Catalog, group-sum DP and cost model shared with the other script, see divide_by_rules.RuleSet
+prune_products = RULES.prune_products
+read_products_file = RULES.read_products_file
+write_products_file = RULES.write_products_file
+reconstruct_groups = RULES.reconstruct_groups
+calculate_spaces = RULES.calculate_spaces
+
+class SolveStats:
+    """
+    Counters and phase timers for one or more find_best_decomposition(stats=...) calls.
+    
+    - phases: seconds per phase ("catalog", "residue", "candidates", "bounds",
+      "dp", "search", "total"); "dp" is also part of "search"
+    - dp_cells: group-sum DP cells filled
+    - combos_examined: catalog combos looked at, by the DP (cells times
+      per-product choices) and as Case 1 single groups
+    - pairs_tried / pairs_rejected: (outside_mult, outside_add) grid pairs that
+      pass / fail the divisibility check
+    - candidates_searched / candidates_pruned: pairs whose layouts were built /
+      skipped by the lower bound
+    - improvements: times the incumbent answer got better
+    Counters are only updated once per phase or candidate, never per DP cell,
+    and not at all without a stats object. Work done in worker processes
+    (workers > 1) isn't counted.
+    """
+    __slots__ = ("phases", "dp_cells", "combos_examined", "pairs_tried", "pairs_rejected",
+                 "candidates_searched", "candidates_pruned", "improvements")
+    
+    def __init__(self):
+        self.phases = {}
+        self.dp_cells = 0
+        self.combos_examined = 0
+        self.pairs_tried = 0
+        self.pairs_rejected = 0
+        self.candidates_searched = 0
+        self.candidates_pruned = 0
+        self.improvements = 0
+    
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+    
+    def as_dict(self):
+        """Plain dict of every counter, for JSON"""
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats["phases"] = {phase: round(seconds, 6) for phase, seconds in self.phases.items()}
+        return stats
+    
+    def format(self):
+        """Human-readable report, one line per counter"""
+        lines = [f"  {phase:20} {seconds * 1000:10.2f} ms" for phase, seconds in self.phases.items()]
+        lines.extend(f"  {name:20} {getattr(self, name):10d}" for name in self.__slots__[1:])
+        return "\n".join(lines)
+
+# SolveStats of the find_best_decomposition call in progress, if any
+_stats = None
+
+# _pruned_improvements(): table cells grown between deadline checks
+DEADLINE_CHUNK = 1 << 14
+
+# greedy_decomposition(): outside_add values tried
+GREEDY_OUTSIDE_ADDS = 32
+
 def generate_all_products(max_product=800, include_overflow=True):
     """
     Generate all possible products from {10,4,3,2} up to max_product
@@ -6,356 +94,680 @@ def generate_all_products(max_product=800, include_overflow=True):
     1. Normal: Follow hierarchy (max 2 tens, 3 fours, 3 threes, 4 twos)
     2. Overflow: Intentionally place numbers to cause overflow (*1 effect)
     3. Draw Cancel: Place 10 in 3rd position or 10/4/3 in 4th position
+    
+    The rules themselves live in RULES, see divide_by_rules.RuleSet.
+    """
+    return RULES.generate_products(max_product)
+
+def load_products(max_product=800, cache_path=None, pruned=True):
+    """RULES.load_products(), timed into the active SolveStats"""
+    return RULES.load_products(max_product, cache_path, pruned, _stats)
+
+def build_group_table(max_target, products, backend=None):
+    """RULES.build_group_table(), timed into the active SolveStats"""
+    return RULES.build_group_table(max_target, products, backend, _stats)
+
+def extend_group_table(table, max_target, products, backend=None):
+    """RULES.extend_group_table(), timed into the active SolveStats"""
+    return RULES.extend_group_table(table, max_target, products, backend, _stats)
+
+def find_best_groups(target, products, table=None):
+    """
+    RULES.find_best_groups(), timed into the active SolveStats
+    Returns: (groups, total_spaces_for_numbers, has_any_overflow, has_any_draw_cancel) or None
+    """
+    return RULES.find_best_groups(target, products, table, _stats)
+
+_residue_tables = {}
+
+def build_residue_table(products):
     """
-    products = {}
+    Shortest paths over residues modulo the most slot-efficient product, giving
+    the minimum group slots (numbers plus the triggers between groups) of any
+    inner target without a DP table as long as the target.
     
-    # Generate all possible 1-4 number combinations (descending order)
-    for length in range(1, 5):
-        generate_combos_recursive([], length, products, max_product)
+    Every group costs its length plus one trigger (the last group's trigger is
+    taken off at the end). With modulus M the product with the lowest slots
+    per unit and c_M its cost, any layout summing to x costs
+    (sum of M * c - c_M * p over its other groups + c_M * x) / M. Those reduced
+    weights are never negative, so one Dijkstra over the M residues finds the
+    cheapest "rest" for each x mod M; padding it with copies of M is optimal
+    whenever x is at least the rest's sum. Smaller targets use a plain slot DP.
     
-    # Generate draw cancel combinations (non-descending order)
-    generate_draw_cancel_combos(products, max_product)
+    Returns: (items, modulus_item, dist, value, pred_item, small_slots, small_item)
+    - items[j] = (product, combo_index, slots) with one shortest combo per product
+    - dist[r] / value[r] = reduced cost / sum of the cheapest rest for residue r
+      (-1 if unreachable), pred_item[r] = its last group
+    - small_slots[x] / small_item[x] = slot DP (with trailing trigger) for x < len
+    """
+    items = []
+    for product, combo_list in products.items():
+        best_index = min(range(len(combo_list)), key=lambda index: len(combo_list[index][0]))
+        items.append((product, best_index, len(combo_list[best_index][0]) + 1))
     
-    return products
-
-def generate_draw_cancel_combos(products, max_product):
-    """Generate specific draw cancel combinations that aren't in descending order"""
-    numbers = [10, 4, 3, 2]
+    modulus_item = min(range(len(items)), key=lambda j: (items[j][2] / items[j][0], -items[j][0]))
+    modulus, _, modulus_slots = items[modulus_item]
     
-    # 3-element combos with 10 in 3rd position
-    for i, n1 in enumerate(numbers):
-        for j, n2 in enumerate(numbers):
-            combo = [n1, n2, 10]
-            if combo == sorted(combo, reverse=True):
-                continue  # Already generated in normal recursion
-            
-            product, has_overflow, draw_cancel = calculate_product_with_overflow(combo)
-            if product <= max_product and draw_cancel:
-                if product not in products:
-                    products[product] = []
-                overflow_count = 1 if has_overflow else 0
-                if (combo, overflow_count, draw_cancel) not in products[product]:
-                    products[product].append((combo, overflow_count, draw_cancel))
-    
-    # 4-element combos with 10/4/3 in 4th position
-    for i, n1 in enumerate(numbers):
-        for j, n2 in enumerate(numbers):
-            for k, n3 in enumerate(numbers):
-                for last in [10, 4, 3]:  # Only these cause draw cancel in 4th position
-                    combo = [n1, n2, n3, last]
-                    if combo == sorted(combo, reverse=True):
-                        continue  # Already generated in normal recursion
-                    
-                    product, has_overflow, draw_cancel = calculate_product_with_overflow(combo)
-                    if product <= max_product and draw_cancel:
-                        if product not in products:
-                            products[product] = []
-                        overflow_count = 1 if has_overflow else 0
-                        if (combo, overflow_count, draw_cancel) not in products[product]:
-                            products[product].append((combo, overflow_count, draw_cancel))
-
-def generate_combos_recursive(current, remaining, products, max_product):
-    """Recursively generate all valid combinations in descending order"""
-    if remaining == 0:
-        if not current:
-            return
-        
-        # Calculate product and check for overflow/draw cancel
-        combo = current[:]
-        product, has_overflow, draw_cancel = calculate_product_with_overflow(combo)
-        
-        if product > max_product:
-            return
-        
-        if product not in products:
-            products[product] = []
+    dist = array('q', [-1]) * modulus
+    value = array('q', [0]) * modulus
+    pred_item = array('i', [-1]) * modulus
+    dist[0] = 0
+    done = bytearray(modulus)
+    
+    heap = [(0, 0, 0)]
+    while heap:
+        d, v, residue = heapq.heappop(heap)
+        if done[residue]:
+            continue
+        done[residue] = 1
         
-        # Store as tuple: (combo, overflow_count, draw_cancel)
-        overflow_count = 1 if has_overflow else 0
-        products[product].append((combo, overflow_count, draw_cancel))
-        return
+        for j, (product, _, slots) in enumerate(items):
+            nr = (residue + product) % modulus
+            nd = d + modulus * slots - modulus_slots * product
+            nv = v + product
+            if not done[nr] and (dist[nr] < 0 or (nd, nv) < (dist[nr], value[nr])):
+                dist[nr] = nd
+                value[nr] = nv
+                pred_item[nr] = j
+                heapq.heappush(heap, (nd, nv, nr))
     
-    # Determine what numbers we can add (must be <= last number to maintain descending order)
-    if len(current) == 0:
-        allowed = [10, 4, 3, 2]
-    else:
-        last_num = current[-1]
-        allowed = [n for n in [10, 4, 3, 2] if n <= last_num]
-    
-    # Try adding each allowed number
-    for num in allowed:
-        new_combo = current + [num]
-        
-        # Check if this is a valid combination
-        if is_valid_combo(new_combo):
-            generate_combos_recursive(new_combo, remaining - 1, products, max_product)
-
-def is_valid_combo(combo):
-    """Check if a combo is valid (follows hierarchy or is valid overflow)"""
-    if len(combo) > 4:
-        return False
-    
-    count_10 = combo.count(10)
-    count_4 = combo.count(4)
-    count_3 = combo.count(3)
-    count_2 = combo.count(2)
-    
-    # Basic limits
-    if count_10 > 3:  # Max 2 normal + 1 overflow
-        return False
-    if count_4 > 4:
-        return False
-    if count_3 > 4:
-        return False
-    if count_2 > 4:
-        return False
+    # Targets below every rest's sum may not fit the padding argument
+    limit = max(value) + 1
+    small_slots = array('i', [-1]) * limit
+    small_item = array('i', [-1]) * limit
+    small_slots[0] = 0
+    for x in range(1, limit):
+        for j, (product, _, slots) in enumerate(items):
+            if product <= x and small_slots[x - product] >= 0:
+                cost = small_slots[x - product] + slots
+                if small_slots[x] < 0 or cost < small_slots[x]:
+                    small_slots[x] = cost
+                    small_item[x] = j
     
-    return True
+    return items, modulus_item, dist, value, pred_item, small_slots, small_item
 
-def check_draw_cancel(combo):
-    """
-    Check if combo causes draw canceling.
-    Draw canceling occurs when:
-    - 10 is in the 3rd position (index 2)
-    - 10, 4, or 3 is in the 4th position (index 3)
-    
-    Draw canceling prevents the need for ADD_TRIGGER + BLOOD_MAGIC combo
-    """
-    if len(combo) >= 3 and combo[2] == 10:
-        return True
-    if len(combo) == 4 and combo[3] in [10, 4, 3]:
-        return True
-    return False
-
-def calculate_product_with_overflow(combo):
-    """
-    Calculate the actual product considering overflow rules.
-    Returns: (product, has_overflow, has_draw_cancel)
-    
-    For draw cancel combos (not in descending order), calculate based on
-    the actual positions that multiply before the draw cancel position.
-    
-    Rules:
-    - First 2 tens multiply normally
-    - First 3 fours multiply normally  
-    - First 3 threes multiply normally
-    - First 4 twos multiply normally
-    - Additional numbers multiply by 1 (overflow)
-    - Draw cancel: 10 in 3rd pos OR 10/4/3 in 4th pos stops execution
-    """
-    product = 1
-    has_overflow = False
-    draw_cancel = check_draw_cancel(combo)
-    
-    # For draw cancel combos, only count numbers BEFORE the draw cancel position
-    if draw_cancel:
-        if len(combo) >= 3 and combo[2] == 10:
-            # 10 in 3rd position - only first 2 numbers multiply
-            effective_combo = combo[:2]
-        elif len(combo) == 4 and combo[3] in [10, 4, 3]:
-            # Draw cancel in 4th position - only first 3 numbers multiply
-            effective_combo = combo[:3]
-        else:
-            effective_combo = combo
-        
-        # Count each number type in the effective combo
-        count_10 = effective_combo.count(10)
-        count_4 = effective_combo.count(4)
-        count_3 = effective_combo.count(3)
-        count_2 = effective_combo.count(2)
-        
-        # Apply normal multiplication rules to effective combo
-        product *= (10 ** min(count_10, 2))
-        product *= (4 ** min(count_4, 3))
-        product *= (3 ** min(count_3, 3))
-        product *= (2 ** min(count_2, 4))
-        
-        return product, has_overflow, draw_cancel
-    
-    # Non-draw-cancel combos use original logic
-    count_10 = combo.count(10)
-    count_4 = combo.count(4)
-    count_3 = combo.count(3)
-    count_2 = combo.count(2)
-    
-    # Check for standard overflow (too many of a number)
-    if count_10 > 2:
-        has_overflow = True
-    if count_4 > 3:
-        has_overflow = True
-    if count_3 > 3:
-        has_overflow = True
-    if count_2 > 4:
-        has_overflow = True
-    
-    # Check for positional overflow
-    # Position 4 (index 3): if it's 10, 4, or 3, it overflows
-    if len(combo) == 4 and combo[3] in [10, 4, 3]:
-        has_overflow = True
-        # This number doesn't contribute to product (it's *1)
-        product_combo = combo[:3]
-        
-        # Recalculate counts without overflow number
-        count_10 = product_combo.count(10)
-        count_4 = product_combo.count(4)
-        count_3 = product_combo.count(3)
-        count_2 = product_combo.count(2)
-        
-        product *= (10 ** min(count_10, 2))
-        product *= (4 ** min(count_4, 3))
-        product *= (3 ** min(count_3, 3))
-        product *= (2 ** min(count_2, 4))
+def load_residue_table(products):
+    """build_residue_table() memoized per catalog object"""
+    entry = _residue_tables.get(id(products))
+    if entry is None or entry[0] is not products:
+        started = time.perf_counter() if _stats is not None else None
+        entry = (products, build_residue_table(products))
+        _residue_tables[id(products)] = entry
+        if started is not None:
+            _stats.add_time("residue", time.perf_counter() - started)
+    return entry[1]
+
+def residue_slots(residue_table, inner_target):
+    """O(1) minimum group slots (numbers plus triggers between groups) for inner_target, or None"""
+    items, modulus_item, dist, value, pred_item, small_slots, small_item = residue_table
+    if inner_target == 0:
+        return 0
+    if inner_target < len(small_slots):
+        slots = small_slots[inner_target]
+        return slots - 1 if slots >= 0 else None
+    
+    modulus, _, modulus_slots = items[modulus_item]
+    residue = inner_target % modulus
+    if dist[residue] < 0:
+        return None
+    return (dist[residue] + modulus_slots * inner_target) // modulus - 1
+
+def residue_groups(residue_table, inner_target, products):
+    """
+    Minimum-slot group decomposition of inner_target from a build_residue_table() table
+    Returns: (groups, total_spaces_for_numbers, has_any_overflow, has_any_draw_cancel) or None
+    """
+    if residue_slots(residue_table, inner_target) is None:
+        return None
+    items, modulus_item, dist, value, pred_item, small_slots, small_item = residue_table
+    
+    chosen = []
+    if inner_target < len(small_slots):
+        x = inner_target
+        while x > 0:
+            chosen.append(small_item[x])
+            x -= items[small_item[x]][0]
     else:
-        # Normal calculation with standard overflow limits
-        product *= (10 ** min(count_10, 2))
-        product *= (4 ** min(count_4, 3))
-        product *= (3 ** min(count_3, 3))
-        product *= (2 ** min(count_2, 4))
+        modulus = items[modulus_item][0]
+        residue = inner_target % modulus
+        rest = value[residue]
+        chosen.extend([modulus_item] * ((inner_target - rest) // modulus))
+        while rest > 0:
+            j = pred_item[residue]
+            chosen.append(j)
+            rest -= items[j][0]
+            residue = (residue - items[j][0]) % modulus
     
-    # Check if combo is not in proper descending order (indicates overflow)
-    expected_order = [10]*count_10 + [4]*count_4 + [3]*count_3 + [2]*count_2
-    if combo != expected_order and not has_overflow:
-        has_overflow = True
+    groups = []
+    for j in chosen:
+        product, combo_index, _ = items[j]
+        groups.append(products[product][combo_index])
     
-    return product, has_overflow, draw_cancel
+    spaces = sum(len(combo) for combo, _, _ in groups)
+    return groups, spaces, any(ov > 0 for _, ov, _ in groups), any(dc for _, _, dc in groups)
 
-def find_best_groups(target, products):
+def group_slot_reach(products, limit):
     """
-    Find the best way to sum to target using products
-    Returns: (groups, total_spaces_for_numbers, has_any_overflow, has_any_draw_cancel) or None
+    reach[s] = largest inner target that s group slots (numbers plus the
+    triggers between groups) could possibly sum to, built until it covers limit.
+    
+    Every group of k numbers is assumed to reach the largest product of any
+    length-k combo, so an inner target x needs at least bisect_left(reach, x)
+    group slots. This never overestimates, so it is safe for pruning.
     """
-    if target == 0:
-        return [], 0, False, False
+    largest = [0] * 5
+    for product, combo_list in products.items():
+        for entry in combo_list:
+            length = len(entry[0])
+            largest[length] = max(largest[length], product)
     
-    if target < 0:
-        return None
+    reach = [0]
+    while reach[-1] < limit:
+        slots = len(reach)
+        best = reach[-1]
+        for length in range(1, min(4, slots) + 1):
+            # The last group takes `length` slots, the rest (minus a trigger) go before it
+            earlier = reach[slots - length - 1] if slots > length else 0
+            best = max(best, largest[length] + earlier)
+        if best == reach[-1] and slots > 5:
+            break  # Catalog can't grow any further
+        reach.append(best)
+    return reach
+
+def inner_lower_bound(quotient, products, reach, residue=None):
+    """
+    Admissible lower bound on the spaces inside the outside multiplier for a quotient:
+    the exact single overflow/draw cancel group (Case 1), or the group slots
+    the +1 decomposition needs according to reach, plus the + itself (Case 2).
+    With a residue table the Case 2 group slots are exact (only the eye is left out).
+    """
+    bound = float('inf')
+    for combo, overflow_count, draw_cancel in products.get(quotient, ()):
+        if overflow_count > 0 or draw_cancel:
+            bound = min(bound, len(combo))
     
-    # dp[i] = (groups, spaces_for_numbers, has_any_overflow, has_any_draw_cancel)
-    dp = [None] * (target + 1)
-    dp[0] = ([], 0, False, False)
+    inner_target = quotient - 1
+    if inner_target == 0:
+        bound = min(bound, 2)
+    elif inner_target > 0 and residue is not None:
+        slots = residue_slots(residue, inner_target)
+        if slots is not None:
+            bound = min(bound, slots + 1)
+    elif inner_target > 0:
+        bound = min(bound, bisect_left(reach, inner_target) + 1)
+    return bound
+
+def outside_candidates(target, limit=1000):
+    """RULES.outside_candidates(), counted into the active SolveStats"""
+    return RULES.outside_candidates(target, limit, _stats)
+
+def find_best_decomposition(target, shared_table=True, products=None, answer_table=None, prune=True, engine="dp",
+                            workers=1, stats=None):
+    """
+    Find the best decomposition optimizing for minimum spaces
     
-    for i in range(1, target + 1):
-        best = None
-        best_spaces = float('inf')
-        
-        for product, combo_list in products.items():
-            if product > i:
-                continue
-            
-            prev = dp[i - product]
-            if prev is None:
-                continue
-            
-            prev_groups, prev_spaces, prev_overflow, prev_draw_cancel = prev
+    products defaults to the cached catalog from load_products().
+    answer_table is an optional write_answer_table() file that is consulted
+    before searching. It only holds DP engine answers, so other engines
+    ignore it.
+    
+    With shared_table (the default) the group-sum DP is filled once up to the
+    largest inner target (target - 1) and every (outside_mult, outside_add)
+    pair is answered by lookup. shared_table=False runs a separate DP per pair.
+    
+    With prune (the default) candidates are visited by an admissible lower
+    bound on their spaces (inner_lower_bound) and the search stops once the
+    bound can no longer beat the incumbent, which still proves optimality.
+    The table is then only grown as far as the visited quotients need.
+    
+    engine="residue" answers the group sums from build_residue_table() instead
+    of the DP table, which minimizes numbers plus triggers and works for
+    targets in the millions. It always prunes, and lifts the 1000 cap on
+    outside_mult / outside_add whenever the best answer found costs more than
+    the cap (cheaper answers can't use either past it).
+    
+    workers > 1 shards the pruned search over a process pool (see
+    _search_parallel); the answer is the same for any number of workers.
+    
+    engine="iterative" hands the target to find_best_decomposition_iterative(),
+    which deepens over the slot count and counts triggers exactly.
+    
+    Pass a SolveStats as stats to have the call's counters and phase timers
+    added to it.
+    """
+    global _stats
+    if stats is None:
+        return _find_best_decomposition(target, shared_table, products, answer_table, prune, engine, workers)
+    
+    previous, _stats = _stats, stats
+    started = time.perf_counter()
+    try:
+        return _find_best_decomposition(target, shared_table, products, answer_table, prune, engine, workers)
+    finally:
+        stats.add_time("total", time.perf_counter() - started)
+        _stats = previous
+
+def _find_best_decomposition(target, shared_table, products, answer_table, prune, engine, workers):
+    """find_best_decomposition() without the stats bookkeeping"""
+    # Special case: for 1-4 modifiers, just use that many modifiers directly
+    if target <= 4:
+        return ([], 0, target, True), target
+    
+    if answer_table is not None and engine == "dp":
+        answer = lookup_answer(answer_table, target)
+        if answer is not None:
+            return answer
+    
+    if products is None:
+        products = load_products()
+    
+    if engine == "iterative":
+        return find_best_decomposition_iterative(target, products)
+    
+    if engine == "residue":
+        residue = load_residue_table(products)
+        limit = 1000
+        while True:
+            best_result, best_spaces = _find_best_decomposition_pruned(
+                target, outside_candidates(target, limit), products, shared_table, residue, workers)
+            if best_result is None or best_spaces <= limit:
+                return best_result, best_spaces
+            limit = best_spaces
+    
+    # Visit the candidates in the original (outside_mult, outside_add) order to
+    # keep tie-breaking
+    candidates = outside_candidates(target)
+    if prune or workers > 1:
+        return _find_best_decomposition_pruned(target, candidates, products, shared_table, workers=workers)
+    
+    return RULES.find_best_decomposition(target, products, shared_table, candidates, _stats)
+
+def _bound_candidates(target, candidates, products, residue=None):
+    """(bound, outside_mult, outside_add) for every candidate, sorted for branch-and-bound"""
+    started = time.perf_counter() if _stats is not None else None
+    reach = group_slot_reach(products, target) if residue is None else None
+    
+    bounded = []
+    for outside_mult, outside_add in candidates:
+        quotient = (target - outside_add) // outside_mult
+        bound = outside_mult + outside_add + inner_lower_bound(quotient, products, reach, residue)
+        bounded.append((bound, outside_mult, outside_add))
+    bounded.sort()
+    
+    if started is not None:
+        _stats.add_time("bounds", time.perf_counter() - started)
+    return bounded
+
+def _find_best_decomposition_pruned(target, candidates, products, shared_table, residue=None, workers=1):
+    """Branch-and-bound over (outside_mult, outside_add) candidates, see find_best_decomposition"""
+    bounded = _bound_candidates(target, candidates, products, residue)
+    
+    if workers > 1:
+        return _search_parallel(target, bounded, products, residue, workers)
+    
+    best_result, best_spaces = None, (None, None)
+    for best_spaces, best_result in _pruned_improvements(target, bounded, products, shared_table, residue):
+        pass
+    return best_result, best_spaces
+
+def _pruned_improvements(target, bounded, products, shared_table, residue=None,
+                         best_key=(float('inf'), 0, 0), deadline_at=None):
+    """
+    Branch-and-bound over _bound_candidates() output, yielding (spaces, result)
+    every time the incumbent key (spaces, outside_mult, outside_add) improves,
+    starting from best_key. Stops early once time.monotonic() passes
+    deadline_at, checked between candidates and every DEADLINE_CHUNK cells
+    while the group table grows. Returns True if the search finished, False
+    if it was cut off.
+    """
+    table = None
+    expired = False
+    
+    def inner_groups(inner_target):
+        nonlocal table, expired
+        if residue is not None:
+            return residue_groups(residue, inner_target, products)
+        if shared_table and (table is None or inner_target >= len(table[0])):
+            # Grow in place, geometrically so there are only a few extensions
+            if table is None:
+                table = build_group_table(0, products)
+                size = inner_target
+            else:
+                size = max(inner_target, 2 * len(table[0]))
+            size = min(size, target - 1)
+            if deadline_at is None:
+                extend_group_table(table, size, products)
+            while len(table[0]) <= size:
+                extend_group_table(table, min(size, len(table[0]) - 1 + DEADLINE_CHUNK), products)
+                if time.monotonic() >= deadline_at:
+                    expired = True
+                    return None
+        return find_best_groups(inner_target, products, table)
+    
+    started = time.perf_counter() if _stats is not None else None
+    searched = 0
+    finished = False
+    try:
+        for bound, outside_mult, outside_add in bounded:
+            # Ties go to the smallest (outside_mult, outside_add), like the full search
+            if (bound, outside_mult, outside_add) > best_key:
+                break
+            if deadline_at is not None and time.monotonic() >= deadline_at:
+                return False
             
-            # Try each combo for this product
-            for combo, overflow_count, draw_cancel in combo_list:
-                new_spaces = prev_spaces + len(combo)
+            searched += 1
+            quotient = (target - outside_add) // outside_mult
+            for main_groups, skip_plus_one in RULES.candidate_layouts(quotient, products, inner_groups, _stats):
+                spaces = calculate_spaces(main_groups, outside_mult, outside_add, skip_plus_one)
                 
-                if new_spaces < best_spaces:
-                    best_spaces = new_spaces
-                    best = (
-                        prev_groups + [(combo, overflow_count, draw_cancel)], 
-                        new_spaces, 
-                        prev_overflow or overflow_count > 0,
-                        prev_draw_cancel or draw_cancel
-                    )
-        
-        dp[i] = best
-    
-    if dp[target] is None:
-        return None
+                if (spaces, outside_mult, outside_add) < best_key:
+                    best_key = (spaces, outside_mult, outside_add)
+                    if _stats is not None:
+                        _stats.improvements += 1
+                    yield spaces, (main_groups, outside_mult, outside_add, skip_plus_one)
+            if expired:
+                return False
+        finished = True
+    finally:
+        if started is not None and _stats is not None:
+            _stats.add_time("search", time.perf_counter() - started)
+            _stats.candidates_searched += searched
+            if finished:
+                _stats.candidates_pruned += len(bounded) - searched
     
-    return dp[target]
+    return True
 
-def calculate_spaces(main_groups, outside_multiplier, outside_addition, skip_plus_one):
+def greedy_decomposition(target, products):
     """
-    Calculate total spaces used:
-    - Each number from set = 1 space
-    - Each (trigger) between groups = 1 space
-    - +1 at end = 1 space (just the +) - unless skipped due to overflow or draw cancel
-    - Outside multiplier = its value in spaces
-    - (eye) = 1 space (if iteration canceling wasn't used AND no draw cancel)
-    - Outside addition = its value in spaces
+    Quick, usually near-optimal answer: for every outside_add below
+    GREEDY_OUTSIDE_ADDS and every outside_mult dividing target - outside_add,
+    cost the +1 decomposition of the quotient with the exact minimum group
+    slots from the residue table, then build the groups of the cheapest.
+    Returns: (result, spaces) like find_best_decomposition
     """
-    spaces = 0
+    residue = load_residue_table(products)
     
-    # Count numbers in groups
-    for combo, overflow, draw_cancel in main_groups:
-        spaces += len(combo)
+    best = None
+    best_spaces = float('inf')
+    for outside_add in range(min(GREEDY_OUTSIDE_ADDS, target)):
+        for outside_mult in sorted(divisors(target - outside_add)):
+            if outside_mult >= 1000:
+                continue
+            inner_target = (target - outside_add) // outside_mult - 1
+            slots = residue_slots(residue, inner_target) if inner_target >= 0 else None
+            if slots is None:
+                continue
+            
+            # Numbers and triggers, the +, the eye and the outside modifiers
+            spaces = slots + 2 + outside_mult + outside_add
+            if spaces < best_spaces:
+                best_spaces = spaces
+                best = (inner_target, outside_mult, outside_add)
     
-    # Count (trigger)s between groups
-    if len(main_groups) > 1:
-        spaces += len(main_groups) - 1
+    if best is None:
+        return None, None
+    inner_target, outside_mult, outside_add = best
+    main_groups = residue_groups(residue, inner_target, products)[0] if inner_target > 0 else []
+    return (main_groups, outside_mult, outside_add, False), calculate_spaces(main_groups, outside_mult, outside_add, False)
+
+def iter_anytime_decompositions(target, deadline=None, products=None, engine="dp"):
+    """
+    Anytime search: yield (result, spaces, proven) right away with a greedy
+    answer, then every strictly better answer as the branch-and-bound search
+    finds it. The last item is always the final answer; proven is True if
+    the search finished (so nothing the DP engine finds is cheaper, and on a
+    tie its answer is the one returned), False if deadline seconds ran out
+    first. The greedy answer counts triggers exactly, so it can end up
+    cheaper than find_best_decomposition()'s. The deadline is checked between
+    candidates and while the group table grows.
+    """
+    # Special case: for 1-4 modifiers, just use that many modifiers directly
+    if target <= 4:
+        yield ([], 0, target, True), target, True
+        return
     
-    # Add cost of +1 if not skipped (just the + sign)
-    if not skip_plus_one:
-        spaces += 1
+    deadline_at = None if deadline is None else time.monotonic() + deadline
+    if products is None:
+        products = load_products()
     
-    # Outside multiplier
-    spaces += outside_multiplier
+    best_result, best_spaces = greedy_decomposition(target, products)
+    yield best_result, best_spaces, False
     
-    # (eye) space (if iteration canceling wasn't used AND no draw cancel)
-    # Draw cancel eliminates the need for ADD_TRIGGER + BLOOD_MAGIC
-    has_draw_cancel = any(dc for _, _, dc in main_groups)
-    if not skip_plus_one and not has_draw_cancel:
-        spaces += 1
+    residue = load_residue_table(products) if engine == "residue" else None
+    bounded = _bound_candidates(target, outside_candidates(target), products, residue)
     
-    # Outside addition
-    spaces += outside_addition
+    # Start from the greedy spaces, but let an equal-spaces candidate take over
+    # so a finished search ends on the canonical answer
+    search = _pruned_improvements(target, bounded, products, True, residue,
+                                  (best_spaces, float('inf'), 0), deadline_at)
+    while True:
+        try:
+            spaces, result = next(search)
+        except StopIteration as stop:
+            proven = stop.value
+            break
+        
+        improved = spaces < best_spaces
+        best_result, best_spaces = result, spaces
+        if improved:
+            yield best_result, best_spaces, False
     
-    return spaces
+    yield best_result, best_spaces, proven
 
-def find_best_decomposition(target):
+def find_best_decomposition_anytime(target, deadline=None, callback=None, products=None, engine="dp"):
     """
-    Find the best decomposition optimizing for minimum spaces
+    Callback flavour of iter_anytime_decompositions(): callback(result, spaces)
+    is called for every streamed answer.
+    Returns: (result, spaces, proven) for the final answer
+    """
+    for result, spaces, proven in iter_anytime_decompositions(target, deadline, products, engine):
+        if callback is not None:
+            callback(result, spaces)
+    return result, spaces, proven
+
+def slot_choices(products):
+    """
+    One (product, length, draw_cancel) per product and draw cancel flag: the
+    shortest combo, largest product first. Longer combos for the same product
+    and flag can never make a layout fit in fewer slots.
+    """
+    shortest = {}
+    for product, combo_list in products.items():
+        for index, (combo, overflow_count, draw_cancel) in enumerate(combo_list):
+            key = (product, bool(draw_cancel))
+            if key not in shortest or len(combo) < len(products[product][shortest[key]][0]):
+                shortest[key] = index
+    return sorted(((product, index, draw_cancel) for (product, draw_cancel), index in shortest.items()),
+                  key=lambda choice: -choice[0])
+
+def find_best_decomposition_iterative(target, products=None, max_spaces=None):
+    """
+    Iterative deepening over the slot count: ask "does target fit in S
+    slots?" for S = 1, 2, ... and return the first layout that fits.
+    
+    For every (outside_mult, outside_add) with outside_mult + outside_add < S
+    the inner budget is what is left. Case 1 needs a single overflow / draw
+    cancel group for the quotient within it, Case 2 needs groups summing to
+    quotient - 1 within it minus the + and the eye (or minus just the + if a
+    group draw cancels). Group feasibility is a memoized depth-first check on
+    (inner sum, slots, needs draw cancel), cut off by the exact minimum group
+    slots from build_residue_table(), so budgets that can't fit are rejected
+    in O(1) and only the states on the way to the answer are expanded.
+    
+    Spaces are exact calculate_spaces() values, triggers included, so the
+    answer is never worse than the DP engine's (and matches the first one
+    from iter_decompositions). Ties go to the original (outside_mult,
+    outside_add) order, Case 1 first.
+    Returns: (result, spaces), or (None, None) if nothing fits in max_spaces
     """
     # Special case: for 1-4 modifiers, just use that many modifiers directly
     if target <= 4:
         return ([], 0, target, True), target
     
-    products = generate_all_products()
+    if products is None:
+        products = load_products()
+    choices = slot_choices(products)
+    residue = load_residue_table(products)
     
-    best_result = None
-    best_spaces = float('inf')
+    # Case 1 cost per quotient: shortest overflow / draw cancel combo
+    single = {}
+    for product, combo_list in products.items():
+        for combo, overflow_count, draw_cancel in combo_list:
+            if (overflow_count > 0 or draw_cancel) and (product not in single or len(combo) < len(single[product][0])):
+                single[product] = (combo, overflow_count, draw_cancel)
     
-    for outside_mult in range(1, min(target + 1, 1000)):
-        for outside_add in range(0, min(target, 1000)):
-            base = target - outside_add
-            
-            if base <= 0 or base % outside_mult != 0:
+    found = {}   # (inner sum, slots, needs draw cancel) -> groups
+    failed = {}  # (inner sum, needs draw cancel) -> largest slots known not to fit
+    
+    def fit_groups(inner_target, slots, need_draw_cancel):
+        """Groups summing to inner_target in at most slots (numbers plus triggers), or None"""
+        if slots <= 0:
+            return None
+        least = residue_slots(residue, inner_target)
+        if least is None or least > slots:
+            return None
+        if failed.get((inner_target, need_draw_cancel), 0) >= slots:
+            return None
+        key = (inner_target, slots, need_draw_cancel)
+        if key in found:
+            return found[key]
+        
+        for product, index, draw_cancel in choices:
+            group = products[product][index]
+            if product > inner_target or len(group[0]) > slots:
                 continue
-            
-            quotient = base // outside_mult
-            
-            # Case 1: Single group with overflow or draw cancel (no +1 needed)
-            inner_target_no_plus = quotient
-            
-            if inner_target_no_plus >= 0 and inner_target_no_plus in products:
-                for combo, overflow_count, draw_cancel in products[inner_target_no_plus]:
-                    if overflow_count > 0 or draw_cancel:
-                        main_groups = [(combo, overflow_count, draw_cancel)]
-                        spaces = calculate_spaces(main_groups, outside_mult, outside_add, True)
-                        
-                        if spaces < best_spaces:
-                            best_spaces = spaces
-                            best_result = (main_groups, outside_mult, outside_add, True)
-            
-            # Case 2: Normal decomposition with +1
-            inner_target = quotient - 1
-            
-            if inner_target >= 0:
-                result = find_best_groups(inner_target, products)
+            if product == inner_target:
+                if draw_cancel or not need_draw_cancel:
+                    found[key] = [group]
+                    return found[key]
+                continue
+            # Another group follows, so this one is paid with a trigger
+            rest = fit_groups(inner_target - product, slots - len(group[0]) - 1,
+                              need_draw_cancel and not draw_cancel)
+            if rest is not None:
+                found[key] = [group] + rest
+                return found[key]
+        
+        failed[(inner_target, need_draw_cancel)] = slots
+        return None
+    
+    spaces = 0
+    while max_spaces is None or spaces < max_spaces:
+        spaces += 1
+        for outside_mult in range(1, spaces):
+            for outside_add in range(spaces - outside_mult):
+                base = target - outside_add
+                if base < 0 or base % outside_mult:
+                    continue
+                quotient = base // outside_mult
+                budget = spaces - outside_mult - outside_add
+                
+                # Case 1: Single group with overflow or draw cancel (no +1 needed)
+                if quotient in single and len(single[quotient][0]) <= budget:
+                    return ([single[quotient]], outside_mult, outside_add, True), spaces
                 
-                if result is not None:
-                    main_groups, _, has_overflow, has_draw_cancel = result
-                    spaces = calculate_spaces(main_groups, outside_mult, outside_add, False)
-                    
-                    if spaces < best_spaces:
-                        best_spaces = spaces
-                        best_result = (main_groups, outside_mult, outside_add, False)
+                # Case 2: Normal decomposition with +1 (and the eye unless a group draw cancels)
+                inner_target = quotient - 1
+                if inner_target == 0:
+                    if budget >= 2:
+                        return ([], outside_mult, outside_add, False), spaces
+                    continue
+                if inner_target < 0:
+                    continue
+                main_groups = fit_groups(inner_target, budget - 2, False)
+                if main_groups is None:
+                    main_groups = fit_groups(inner_target, budget - 1, True)
+                if main_groups is not None:
+                    return (main_groups, outside_mult, outside_add, False), spaces
+    
+    return None, None
+
+def cross_check_engines(lo, hi, products=None):
+    """
+    Solve every target lo..hi with the DP engine and the iterative deepening
+    engine and yield (target, dp_spaces, iterative_spaces) wherever they
+    differ. The iterative engine counts triggers exactly, so it may come out
+    lower; a higher count means one of the engines is wrong.
+    """
+    if products is None:
+        products = load_products()
+    solver = Solver(products)
+    solver.ensure(hi)
+    for target in range(lo, hi + 1):
+        _, dp_spaces = solver.solve(target)
+        _, iterative_spaces = find_best_decomposition_iterative(target, products)
+        if dp_spaces != iterative_spaces:
+            yield target, dp_spaces, iterative_spaces
+
+# (target, products, table, residue, shared best spaces) inherited by forked workers
+_parallel_state = None
+
+def _search_parallel(target, bounded, products, residue, workers):
+    """
+    Shard bounded candidates round-robin over a forked process pool.
     
-    return best_result, best_spaces if best_result else (None, None)
+    The catalog and the group-sum table (or residue table) are built once in
+    the parent and inherited by the workers through fork. Workers publish
+    every improvement to a shared best spaces value and stop their shard
+    once its bound exceeds it. Each worker reports its best
+    (spaces, outside_mult, outside_add, case order) and the parent takes the
+    minimum, which is the serial engine's answer whatever the worker count.
+    Falls back to the serial search where fork isn't available, or where the
+    workers can't be handed _search_shard (this module loaded under a name
+    it can't be imported by, e.g. from a file path).
+    """
+    global _parallel_state
+    serial = [(m, a) for _, m, a in bounded]
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        return _find_best_decomposition_pruned(target, serial, products, True, residue)
+    
+    table = build_group_table(target - 1, products) if residue is None else None
+    shared_best = context.Value('i', 2 ** 31 - 1)
+    _parallel_state = (target, products, table, residue, shared_best)
+    try:
+        with context.Pool(workers) as pool:
+            shard_bests = pool.map(_search_shard, [bounded[k::workers] for k in range(workers)])
+    except pickle.PicklingError:
+        return _find_best_decomposition_pruned(target, serial, products, True, residue)
+    finally:
+        _parallel_state = None
+    
+    shard_bests = [best for best in shard_bests if best is not None]
+    if not shard_bests:
+        return None, (None, None)
+    key, best_result = min(shard_bests, key=lambda best: best[0])
+    return best_result, key[0]
+
+def _search_shard(shard):
+    """Worker side of _search_parallel(): best (key, result) within one shard, or None"""
+    target, products, table, residue, shared_best = _parallel_state
+    
+    def inner_groups(inner_target):
+        if residue is not None:
+            return residue_groups(residue, inner_target, products)
+        return find_best_groups(inner_target, products, table)
+    
+    best = None
+    for bound, outside_mult, outside_add in shard:
+        # Equal bounds still run: they may win the tie-break on a smaller pair
+        if bound > shared_best.value:
+            break
+        
+        quotient = (target - outside_add) // outside_mult
+        layouts = RULES.candidate_layouts(quotient, products, inner_groups)
+        for order, (main_groups, skip_plus_one) in enumerate(layouts):
+            spaces = calculate_spaces(main_groups, outside_mult, outside_add, skip_plus_one)
+            key = (spaces, outside_mult, outside_add, order)
+            
+            if best is None or key < best[0]:
+                best = (key, (main_groups, outside_mult, outside_add, skip_plus_one))
+                with shared_best.get_lock():
+                    if spaces < shared_best.value:
+                        shared_best.value = spaces
+    
+    return best
 
 def format_spell_ids(main_groups, outside_multiplier, outside_addition, skip_plus_one):
     """Format the result as comma-separated spell IDs"""
@@ -409,11 +821,1263 @@ def format_spell_ids(main_groups, outside_multiplier, outside_addition, skip_plu
     
     return ",".join(spells)
 
+# Spell list opcodes: DIVIDE_* are their SYMBOLS index, so a run of them packs
+# straight into an encode_combo() code
+SPELL_OPCODES = {
+    "DIVIDE_10": 0,
+    "DIVIDE_4": 1,
+    "DIVIDE_3": 2,
+    "DIVIDE_2": 3,
+    "ADD_TRIGGER": 4,
+    "modifier": 5,
+    "BLOOD_MAGIC": 6,
+}
+_OP_TRIGGER = 4
+_OP_MODIFIER = 5
+_OP_EYE = 6
+
+def compile_spell_list(spell_list):
+    """Compile a format_spell_ids() string into opcode bytes (see SPELL_OPCODES)"""
+    if not spell_list:
+        return b""
+    try:
+        return bytes([SPELL_OPCODES[name] for name in spell_list.split(",")])
+    except KeyError as error:
+        raise ValueError(f"unknown spell {error.args[0]!r}") from None
+
+def run_spell_program(program):
+    """
+    Execute a compiled spell list on a wand.
+    
+    - Runs of DIVIDE_* are groups, ADD_TRIGGER separates them; each group's
+      product, overflow and draw cancel come from the compiled RULES table
+    - The modifiers after the chain are cast (sum of group products + 1) times
+      if the chain ends with ADD_TRIGGER and BLOOD_MAGIC (the eye) closes the
+      block, (sum of group products) times otherwise (overflow / draw cancel)
+    - Without the eye nothing ends the block, so every modifier after the
+      chain is multiplied; with it the modifiers after it are cast once
+    - No groups: every modifier is cast once
+    Returns: (copies, slots)
+    Raises: ValueError for a list that isn't a valid layout
+    """
+    groups_sum = 0
+    group_count = 0
+    code = 0
+    length = 0
+    trailing_trigger = False
+    
+    i = 0
+    size = len(program)
+    while i < size:
+        op = program[i]
+        if op < _OP_TRIGGER:
+            if length == 4:
+                raise ValueError("more than 4 divides in a group")
+            code |= op << (2 * length)
+            length += 1
+            trailing_trigger = False
+        elif op == _OP_TRIGGER:
+            if length == 0:
+                raise ValueError("ADD_TRIGGER without a group before it")
+            groups_sum += RULES.evaluate_code(code, length)[0]
+            group_count += 1
+            code = 0
+            length = 0
+            trailing_trigger = True
+        else:
+            break
+        i += 1
+    if length:
+        groups_sum += RULES.evaluate_code(code, length)[0]
+        group_count += 1
+    
+    multiplied = 0
+    added = 0
+    eye = False
+    while i < size:
+        op = program[i]
+        if op == _OP_MODIFIER:
+            if eye:
+                added += 1
+            else:
+                multiplied += 1
+        elif op == _OP_EYE and not eye and group_count:
+            eye = True
+        else:
+            raise ValueError(f"unexpected spell at position {i + 1}")
+        i += 1
+    
+    if group_count == 0:
+        return multiplied, size
+    plus_one = 1 if trailing_trigger and eye else 0
+    return (groups_sum + plus_one) * multiplied + added, size
+
+def simulate_spell_list(spell_list):
+    """Returns: (copies, slots) a format_spell_ids() string yields, see run_spell_program()"""
+    return run_spell_program(compile_spell_list(spell_list))
+
+def validate_spell_lists(rows):
+    """
+    Check (target, spaces, spell IDs) rows, e.g. from solve_range() or a --range
+    table, by simulating every spell list.
+    Yields: (target, spaces, spell_list, copies, slots, error) for every row
+    whose copies or slot count don't match, or that doesn't run (error set,
+    copies and slots None). Rows without an answer (spaces None) are skipped.
+    """
+    compiled = {}
+    for target, spaces, spell_list in rows:
+        if spaces is None:
+            continue
+        # Many targets share a spell list, so each distinct one is simulated once
+        outcome = compiled.get(spell_list)
+        if outcome is None:
+            try:
+                outcome = simulate_spell_list(spell_list) + (None,)
+            except ValueError as error:
+                outcome = (None, None, str(error))
+            compiled[spell_list] = outcome
+        copies, slots, error = outcome
+        if error is not None or copies != target or slots != spaces:
+            yield target, spaces, spell_list, copies, slots, error
+
+def read_range_table(path):
+    """Yield (target, spaces, spell IDs) rows from a --range output file ("-" for stdin)"""
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != 3:
+                continue
+            target, spaces, spell_list = fields
+            yield int(target), None if spaces == "None" else int(spaces), spell_list
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def best_inner_layouts(max_quotient, products, table):
+    """
+    Cheapest layout inside the outside multiplier for every quotient 1..max_quotient,
+    with the same case order and tie-breaking as find_best_decomposition.
+    
+    The table must cover max_quotient - 1. Costs are calculate_spaces() with
+    no outside multiplier/addition, so the full cost is cost + mult + add.
+    Returns: (costs, case1_index, group_counts) arrays
+    - costs[q] = spaces, or -1 if q can't be reached
+    - case1_index[q] = index into products[q] of the single overflow/draw cancel
+      group, or -1 if the +1 decomposition over table[q - 1] is used
+    - group_counts[i] = groups in table's decomposition of inner target i, so
+      the +1 layout is costed from the table without rebuilding its groups
+    """
+    layouts = (array('i', [-1]), array('h', [-1]), array('i', [0]))
+    return extend_inner_layouts(layouts, max_quotient, products, table)
+
+def extend_inner_layouts(layouts, max_quotient, products, table):
+    """Fill the missing quotients of best_inner_layouts() arrays in place. Returns layouts."""
+    costs, case1_index, group_counts = layouts
+    dp_spaces, dp_product, _, dp_flags = table
+    
+    for quotient in range(len(costs), max_quotient + 1):
+        best = -1
+        best_index = -1
+        
+        # Case 1: Single group with overflow or draw cancel (no +1 needed)
+        for index, (combo, overflow_count, draw_cancel) in enumerate(products.get(quotient, ())):
+            if overflow_count > 0 or draw_cancel:
+                spaces = calculate_spaces([(combo, overflow_count, draw_cancel)], 0, 0, True)
+                if best < 0 or spaces < best:
+                    best = spaces
+                    best_index = index
+        
+        # Case 2: Normal decomposition with +1, costed like calculate_spaces():
+        # numbers, triggers between groups, the + and the eye unless a group
+        # draw cancels
+        inner = quotient - 1
+        if inner == len(group_counts):
+            group_counts.append(group_counts[inner - dp_product[inner]] + 1 if dp_spaces[inner] >= 0 else 0)
+        if dp_spaces[inner] >= 0:
+            spaces = dp_spaces[inner] + max(group_counts[inner] - 1, 0) + 1 + (0 if dp_flags[inner] & 2 else 1)
+            if best < 0 or spaces < best:
+                best = spaces
+                best_index = -1
+        
+        costs.append(best)
+        case1_index.append(best_index)
+    
+    return layouts
+
+def inner_layout_groups(layouts, quotient, products, table):
+    """Rebuild (main_groups, skip_plus_one) for a quotient from best_inner_layouts() arrays"""
+    index = layouts[1][quotient]
+    if index >= 0:
+        return [products[quotient][index]], True
+    return find_best_groups(quotient - 1, products, table)[0], False
+
+def iter_best_decompositions(lo, hi, products=None):
+    """
+    Yield (target, result, spaces) for every target lo..hi in ascending order,
+    each identical to find_best_decomposition(target).
+    
+    One group-sum DP table and one catalog are shared by all targets:
+    - every quotient's inner layout is costed once (best_inner_layouts)
+    - base[x] = cheapest outside_mult dividing x, costed once per (mult, quotient)
+    - each target takes the best base x in its outside_add window
+      [target - 999, target] from a monotonic deque, so the whole range
+      costs O(hi log hi) instead of one full search per target
+    """
+    if products is None:
+        products = load_products()
+    lo = max(lo, 1)
+    
+    # Special case: for 1-4 modifiers, just use that many modifiers directly
+    while lo <= min(hi, 4):
+        yield lo, ([], 0, lo, True), lo
+        lo += 1
+    if lo > hi:
+        return
+    
+    table = build_group_table(hi - 1, products)
+    layouts = best_inner_layouts(hi, products, table)
+    costs = layouts[0]
+    
+    # base_cost[x] / base_mult[x]: cheapest (cost + outside_mult) for base x,
+    # ties go to the smallest outside_mult like the nested search loops
+    base_cost = array('i', [-1]) * (hi + 1)
+    base_mult = array('i', [0]) * (hi + 1)
+    for outside_mult in range(1, min(hi + 1, 1000)):
+        for base in range(outside_mult, hi + 1, outside_mult):
+            cost = costs[base // outside_mult]
+            if cost < 0:
+                continue
+            cost += outside_mult
+            if base_cost[base] < 0 or cost < base_cost[base]:
+                base_cost[base] = cost
+                base_mult[base] = outside_mult
+    
+    # For a fixed target the spaces of base x are base_cost[x] + target - x, so
+    # candidates compare by (base_cost[x] - x, outside_mult, outside_add) no
+    # matter which target asks
+    def key(base):
+        return base_cost[base] - base, base_mult[base], -base
+    
+    window = deque()
+    for target in range(max(1, lo - 999), hi + 1):
+        if base_cost[target] >= 0:
+            target_key = key(target)
+            while window and key(window[-1]) > target_key:
+                window.pop()
+            window.append(target)
+        while window and window[0] < target - 999:
+            window.popleft()
+        
+        if target < lo:
+            continue
+        
+        if not window:
+            yield target, None, None
+            continue
+        
+        base = window[0]
+        outside_mult = base_mult[base]
+        main_groups, skip_plus_one = inner_layout_groups(layouts, base // outside_mult, products, table)
+        
+        yield target, (main_groups, outside_mult, target - base, skip_plus_one), base_cost[base] + target - base
+
+def solve_range(lo, hi, products=None):
+    """
+    Stream (target, spaces, spell IDs) for every target lo..hi, sharing one
+    DP table and catalog across the whole range (see iter_best_decompositions)
+    """
+    for target, result, spaces in iter_best_decompositions(lo, hi, products):
+        if result is None:
+            yield target, None, None
+        else:
+            yield target, spaces, format_spell_ids(*result)
+
+# Solver.iter_answers(): least number of targets the base arrays grow by at once
+BATCH_GROWTH = 4096
+
+class ResultTable:
+    """
+    Columnar store of (result, spaces) answers: one row per answer in a few
+    typed arrays, with every group packed into 16 bits (RULES.pack_group), so
+    a row costs about 15 bytes plus 2 per group instead of a tuple of lists.
+    Rows are decoded back into find_best_decomposition() results only when
+    read. Rows without an answer have spaces -1.
+    """
+    __slots__ = ("spaces", "outside_mult", "outside_add", "skip_plus_one", "group_end", "groups")
+    
+    def __init__(self):
+        self.spaces = array('i')
+        self.outside_mult = array('H')
+        self.outside_add = array('H')
+        self.skip_plus_one = array('B')
+        self.group_end = array('I')
+        self.groups = array('H')
+    
+    def __len__(self):
+        return len(self.spaces)
+    
+    def append(self, result, spaces):
+        """Store a (result, spaces) answer (result may be None). Returns: its row"""
+        if result is None:
+            self.spaces.append(-1)
+            self.outside_mult.append(0)
+            self.outside_add.append(0)
+            self.skip_plus_one.append(0)
+        else:
+            main_groups, outside_mult, outside_add, skip_plus_one = result
+            self.spaces.append(spaces)
+            self.outside_mult.append(outside_mult)
+            self.outside_add.append(outside_add)
+            self.skip_plus_one.append(int(skip_plus_one))
+            self.groups.extend(RULES.pack_group(group) for group in main_groups)
+        self.group_end.append(len(self.groups))
+        return len(self.spaces) - 1
+    
+    def get(self, row):
+        """Returns: (result, spaces) for a row, or (None, None) if it has no answer"""
+        if self.spaces[row] < 0:
+            return None, None
+        start = self.group_end[row - 1] if row > 0 else 0
+        main_groups = [RULES.unpack_group(group) for group in self.groups[start:self.group_end[row]]]
+        result = (main_groups, self.outside_mult[row], self.outside_add[row], bool(self.skip_plus_one[row]))
+        return result, self.spaces[row]
+    
+    def spell_ids(self, row):
+        """format_spell_ids() of a row, or None if it has no answer"""
+        result, _ = self.get(row)
+        return format_spell_ids(*result) if result is not None else None
+    
+    def nbytes(self):
+        """Bytes held by the columns"""
+        return sum(len(column) * column.itemsize for column in
+                   (self.spaces, self.outside_mult, self.outside_add, self.skip_plus_one, self.group_end, self.groups))
+
+def build_result_table(lo, hi, products=None):
+    """ResultTable with the answer for target lo + row in each row, see iter_best_decompositions()"""
+    results = ResultTable()
+    for target, result, spaces in iter_best_decompositions(lo, hi, products):
+        results.append(result, spaces)
+    return results
+
+class Solver:
+    """
+    Stateful solver for a series of queries, e.g. 312, then 313, then 320.
+    
+    Keeps the group-sum DP table, the cheapest inner layout per quotient and
+    every answer found so far. A larger target only extends the table and the
+    layouts by the missing cells; a smaller one is served from what is
+    already built. Answers are identical to find_best_decomposition() and are
+    kept packed in a ResultTable, rows[target] being the target's row (-1 if
+    not solved yet).
+    
+    iter_answers() streams many increasing targets instead, through the
+    per-base arrays of iter_best_decompositions() (base_cost, base_mult).
+    """
+    
+    def __init__(self, products=None):
+        self.products = products if products is not None else load_products()
+        self.table = build_group_table(0, self.products)
+        self.layouts = (array('i', [-1]), array('h', [-1]), array('i', [0]))
+        self.results = ResultTable()
+        self.rows = array('i')
+        self.base_cost = array('i', [-1])
+        self.base_mult = array('i', [0])
+    
+    def ensure(self, max_target):
+        """Grow the table and the inner layouts to cover targets up to max_target"""
+        extend_group_table(self.table, max_target - 1, self.products)
+        extend_inner_layouts(self.layouts, max_target, self.products, self.table)
+    
+    def solve(self, target):
+        """Same (result, spaces) as find_best_decomposition(target)"""
+        if target < len(self.rows) and self.rows[target] >= 0:
+            return self.results.get(self.rows[target])
+        
+        # Special case: for 1-4 modifiers, just use that many modifiers directly
+        if target <= 4:
+            return ([], 0, target, True), target
+        
+        self.ensure(target)
+        costs = self.layouts[0]
+        
+        best = None
+        best_spaces = -1
+        for outside_mult, outside_add in outside_candidates(target):
+            cost = costs[(target - outside_add) // outside_mult]
+            if cost < 0:
+                continue
+            spaces = cost + outside_mult + outside_add
+            if best is None or spaces < best_spaces:
+                best = (outside_mult, outside_add)
+                best_spaces = spaces
+        
+        if best is None:
+            answer = None, None
+        else:
+            outside_mult, outside_add = best
+            quotient = (target - outside_add) // outside_mult
+            main_groups, skip_plus_one = inner_layout_groups(self.layouts, quotient, self.products, self.table)
+            answer = (main_groups, outside_mult, outside_add, skip_plus_one), best_spaces
+        
+        if len(self.rows) <= target:
+            self.rows.extend(array('i', [-1]) * (target + 1 - len(self.rows)))
+        self.rows[target] = self.results.append(*answer)
+        return answer
+    
+    def ensure_bases(self, max_target):
+        """Grow base_cost / base_mult (see iter_best_decompositions()) to cover bases up to max_target"""
+        start = len(self.base_cost)
+        if max_target < start:
+            return
+        self.ensure(max_target)
+        costs = self.layouts[0]
+        base_cost = self.base_cost
+        base_mult = self.base_mult
+        base_cost.extend(array('i', [-1]) * (max_target + 1 - start))
+        base_mult.extend(array('i', [0]) * (max_target + 1 - start))
+        
+        # Each base still sees its outside_mults in ascending order, so ties match
+        for outside_mult in range(1, min(max_target + 1, 1000)):
+            first = max(outside_mult, -(-start // outside_mult) * outside_mult)
+            for base in range(first, max_target + 1, outside_mult):
+                cost = costs[base // outside_mult]
+                if cost < 0:
+                    continue
+                cost += outside_mult
+                if base_cost[base] < 0 or cost < base_cost[base]:
+                    base_cost[base] = cost
+                    base_mult[base] = outside_mult
+    
+    def iter_answers(self, targets, step=BATCH_GROWTH):
+        """
+        Yield (target, result, spaces) for targets given in increasing order
+        without repeats, each identical to solve(target) but not kept.
+        
+        Like iter_best_decompositions(), every target takes the best base in
+        its outside_add window from one monotonic deque, and only the bases
+        since the previous target (at most 1000) enter it, so a dense run of
+        targets costs about what solve_range() does. The base arrays grow by
+        at least step targets at a time.
+        """
+        base_cost = self.base_cost
+        base_mult = self.base_mult
+        
+        def key(base):
+            return base_cost[base] - base, base_mult[base], -base
+        
+        window = deque()
+        scanned = 1
+        for target in targets:
+            # Special case: for 1-4 modifiers, just use that many modifiers directly
+            if target <= 4:
+                yield target, ([], 0, target, True), target
+                continue
+            
+            if target >= len(base_cost):
+                self.ensure_bases(max(target, len(base_cost) + step))
+            
+            for base in range(max(scanned, target - 999), target + 1):
+                if base_cost[base] >= 0:
+                    base_key = key(base)
+                    while window and key(window[-1]) > base_key:
+                        window.pop()
+                    window.append(base)
+            scanned = target + 1
+            while window and window[0] < target - 999:
+                window.popleft()
+            
+            if not window:
+                yield target, None, None
+                continue
+            
+            base = window[0]
+            outside_mult = base_mult[base]
+            main_groups, skip_plus_one = inner_layout_groups(self.layouts, base // outside_mult,
+                                                             self.products, self.table)
+            yield target, (main_groups, outside_mult, target - base, skip_plus_one), base_cost[base] + target - base
+
+def iter_decompositions(target, k=None, max_spaces=None, products=None):
+    """
+    Lazily yield (result, spaces) layouts for target in nondecreasing spaces,
+    optimal ones first, then near-optimal alternatives (e.g. without
+    BLOOD_MAGIC or with fewer DIVIDE_10), stopping after k results or once
+    spaces exceed max_spaces.
+    
+    Best-first search over partial group lists, seeded with every
+    (outside_mult, outside_add) candidate. Each partial list is ranked by its
+    spaces so far plus the exact minimum group slots of what is left
+    (residue_slots), so a layout is only reported once nothing cheaper can
+    still be completed, and only the states needed for the first results are
+    expanded. Groups are added in catalog order (largest product first, never
+    going back), so reorderings of the same groups are reported once.
+    
+    Spaces are exact calculate_spaces() values, triggers included, so the
+    first result can beat the DP engine's answer. products defaults to the
+    full (unpruned) catalog for more variety.
+    """
+    if products is None:
+        products = load_products(pruned=False)
+    residue = load_residue_table(products)
+    
+    items = [(product, (combo, overflow_count, draw_cancel))
+             for product, combo_list in products.items()
+             for combo, overflow_count, draw_cancel in combo_list]
+    items.sort(key=lambda item: -item[0])
+    
+    # Heap entries: (spaces or bound, outside_mult, outside_add, tie counter, result, partial)
+    # with either a finished result, or a partial list
+    # (remaining, next item, groups, slots incl. one trigger per group)
+    heap = []
+    counter = 0
+    
+    def push(priority, outside_mult, outside_add, result=None, partial=None):
+        nonlocal counter
+        if max_spaces is None or priority <= max_spaces:
+            heapq.heappush(heap, (priority, outside_mult, outside_add, counter, result, partial))
+            counter += 1
+    
+    # Special case: for 1-4 modifiers, just use that many modifiers directly
+    if target <= 4:
+        push(target, 0, target, ([], 0, target, True))
+    
+    limit = 1000 if max_spaces is None else min(1000, max_spaces + 1)
+    for outside_mult, outside_add in outside_candidates(target, limit):
+        quotient = (target - outside_add) // outside_mult
+        
+        # Case 1: Single group with overflow or draw cancel (no +1 needed)
+        for combo, overflow_count, draw_cancel in products.get(quotient, ()):
+            if overflow_count > 0 or draw_cancel:
+                main_groups = [(combo, overflow_count, draw_cancel)]
+                spaces = calculate_spaces(main_groups, outside_mult, outside_add, True)
+                push(spaces, outside_mult, outside_add, (main_groups, outside_mult, outside_add, True))
+        
+        # Case 2: Normal decomposition with +1 (needs at least one group, an
+        # empty chain has nothing to add the +1 to)
+        inner_target = quotient - 1
+        if inner_target > 0:
+            slots = residue_slots(residue, inner_target)
+            if slots is not None:
+                push(slots + 1 + outside_mult + outside_add, outside_mult, outside_add, partial=(inner_target, 0, (), 0))
+    
+    found = 0
+    while heap:
+        priority, outside_mult, outside_add, _, result, partial = heapq.heappop(heap)
+        
+        if result is not None:
+            yield result, priority
+            found += 1
+            if k is not None and found >= k:
+                return
+            continue
+        
+        remaining, start, groups, slots = partial
+        for j in range(start, len(items)):
+            product, group = items[j]
+            if product > remaining:
+                continue
+            
+            rest = remaining - product
+            if rest == 0:
+                main_groups = list(groups) + [group]
+                spaces = calculate_spaces(main_groups, outside_mult, outside_add, False)
+                push(spaces, outside_mult, outside_add, (main_groups, outside_mult, outside_add, False))
+                continue
+            
+            rest_slots = residue_slots(residue, rest)
+            if rest_slots is not None:
+                new_slots = slots + len(group[0]) + 1
+                # Group slots are at least new_slots + rest_slots; + the +1, eye unknown yet
+                bound = new_slots + rest_slots + 1 + outside_mult + outside_add
+                push(bound, outside_mult, outside_add, partial=(rest, j, groups + (group,), new_slots))
+
+def _bit_positions(bits):
+    """Indices of the set bits of an int bitset, ascending"""
+    binary = bin(bits)[:1:-1]
+    return [i for i, digit in enumerate(binary) if digit == "1"]
+
+def _bits_from_positions(positions):
+    """Int bitset with the given bit indices set"""
+    if not positions:
+        return 0
+    packed = bytearray((max(positions) >> 3) + 1)
+    for position in positions:
+        packed[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(packed, "little")
+
+class ReachabilityIndex:
+    """
+    Which targets a wand with a budget of k free slots can hit.
+    
+    Built layer by layer by slot count from the product catalog with the
+    calculate_spaces() cost model (triggers and eye included), and kept as
+    one int bitset per budget, so queries never run a search. Layers are
+    added on demand when a larger budget is asked for.
+    - groups[s] / groups_dc[s]: inner sums reachable with at most s group
+      slots (numbers plus triggers between groups) / with a draw cancel group
+    - inner[c]: quotients whose inner layout costs at most c spaces
+    - outside[j]: quotient * outside_mult with inner cost + outside_mult <= j
+    - budgets[k]: targets reachable within k spaces (outside_add shifts by 1 per space)
+    """
+    
+    def __init__(self, products=None):
+        self.products = products if products is not None else load_products(pruned=False)
+        
+        # Products of every combo, by (length, draw cancel)
+        self.by_length = {}
+        for product, combo_list in self.products.items():
+            for combo, overflow_count, draw_cancel in combo_list:
+                self.by_length.setdefault((len(combo), bool(draw_cancel)), set()).add(product)
+        
+        self.groups = [1]
+        self.groups_dc = [0]
+        self.inner = [0]
+        self.outside = [0]
+        self.budgets = [1]
+    
+    def _add_group_layer(self):
+        slots = len(self.groups)
+        exact = 0
+        exact_dc = 0
+        for (length, draw_cancel), products in self.by_length.items():
+            if length > slots:
+                continue
+            # The last group takes `length` slots, earlier groups and a trigger the rest
+            if length == slots:
+                before, before_dc = 1, 0
+            else:
+                before = self.groups[slots - length - 1]
+                before_dc = self.groups_dc[slots - length - 1]
+                before &= ~1  # the empty layout has no trigger to put after it
+            for product in products:
+                exact |= before << product
+                exact_dc |= (before if draw_cancel else before_dc) << product
+        self.groups.append(self.groups[-1] | exact)
+        self.groups_dc.append(self.groups_dc[-1] | exact_dc)
+    
+    def _add_inner_layer(self):
+        cost = len(self.inner)
+        while len(self.groups) < cost:
+            self._add_group_layer()
+        
+        # Case 1: Single group with overflow or draw cancel (no +1 needed)
+        bits = self.inner[-1]
+        for product, combo_list in self.products.items():
+            for combo, overflow_count, draw_cancel in combo_list:
+                if (overflow_count > 0 or draw_cancel) and len(combo) <= cost:
+                    bits |= 1 << product
+        
+        # Case 2: +1 costs a space, the eye another unless a group draw cancels
+        if cost >= 2:
+            bits |= self.groups[cost - 2] << 1
+        if cost >= 1:
+            bits |= self.groups_dc[cost - 1] << 1
+        self.inner.append(bits)
+    
+    def _add_budget_layer(self):
+        budget = len(self.budgets)
+        while len(self.inner) < budget:
+            self._add_inner_layer()
+        
+        # New (outside_mult, inner cost) pairs adding up to this budget; only
+        # quotients new to that inner cost need stretching
+        positions = []
+        for outside_mult in range(1, budget):
+            cost = budget - outside_mult
+            new = self.inner[cost] & ~self.inner[cost - 1]
+            positions.extend(quotient * outside_mult for quotient in _bit_positions(new))
+        self.outside.append(self.outside[-1] | _bits_from_positions(positions))
+        
+        # Within k spaces includes everything within k - 1
+        bits = self.budgets[-1] | self.outside[budget] | (self.budgets[-1] << 1)
+        # Special case: for 1-4 modifiers, just use that many modifiers directly
+        if budget <= 4:
+            bits |= 1 << budget
+        self.budgets.append(bits)
+    
+    def bitset(self, k):
+        """Int bitset of the targets reachable within k spaces (bit 0 is the empty wand)"""
+        while len(self.budgets) <= k:
+            self._add_budget_layer()
+        return self.budgets[k] & ~1
+    
+    def reachable(self, k):
+        """Sorted targets reachable within k spaces"""
+        return _bit_positions(self.bitset(k))
+    
+    def is_reachable(self, target, k):
+        return bool(self.bitset(k) >> target & 1)
+    
+    def max_reachable(self, k):
+        """Largest target reachable within k spaces (0 if none)"""
+        return self.bitset(k).bit_length() - 1 if self.bitset(k) else 0
+
+# Answer table file: header (magic, ANSWER_TABLE_VERSION, max_product, lo, hi), then
+# one fixed-width record per target lo..hi: spaces, outside_mult, outside_add
+# (uint16), skip_plus_one, group count (uint8) and ANSWER_MAX_GROUPS uint16
+# slots of RULES.pack_group() codes. A group count of 255 marks a target that
+# isn't stored (no answer or too many groups).
+ANSWER_MAX_GROUPS = 16
+# Rules plus cost model: bump the cost part whenever calculate_spaces() or the
+# cases the searches allow change, so tables written before are rebuilt
+ANSWER_TABLE_VERSION = RULES_VERSION + "/cost-1"
+_ANSWER_MAGIC = b"DBAT"
+# Magic of tables written with an earlier cost model, rebuilt like a stale version
+_ANSWER_STALE_MAGICS = (b"DBA2",)
+_ANSWER_HEADER = struct.Struct("<4s32sIII")
+_ANSWER_RECORD = struct.Struct("<HHHBB%ds" % (2 * ANSWER_MAX_GROUPS))
+_ANSWER_MISSING = 255
+
+_answer_tables = {}
+
+def write_answer_table(path, lo, hi, max_product=800):
+    """Precompute the answers for targets lo..hi into a fixed-record file"""
+    products = load_products(max_product)
+    lo = max(lo, 1)
+    
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_ANSWER_HEADER.pack(_ANSWER_MAGIC, ANSWER_TABLE_VERSION.encode(), max_product, lo, hi))
+        for target, result, spaces in iter_best_decompositions(lo, hi, products):
+            if result is None or len(result[0]) > ANSWER_MAX_GROUPS:
+                f.write(_ANSWER_RECORD.pack(0, 0, 0, 0, _ANSWER_MISSING, b""))
+                continue
+            
+            main_groups, outside_mult, outside_add, skip_plus_one = result
+            packed = struct.pack("<%dH" % len(main_groups), *[RULES.pack_group(group) for group in main_groups])
+            f.write(_ANSWER_RECORD.pack(spaces, outside_mult, outside_add, int(skip_plus_one), len(main_groups), packed))
+    
+    # Replace atomically so readers never map a half-written table
+    _answer_tables.pop(path, None)
+    os.replace(tmp_path, path)
+
+def open_answer_table(path, max_product=800):
+    """
+    Memory-map an answer table, rebuilding it over the same target range if it
+    was written for other rules, another cost model (ANSWER_TABLE_VERSION) or
+    another max_product.
+    Returns: (mapping, lo, hi), or None if there's no usable file at path
+    """
+    if path in _answer_tables:
+        return _answer_tables[path]
+    if not os.path.exists(path):
+        return None
+    
+    with open(path, "rb") as f:
+        header = f.read(_ANSWER_HEADER.size)
+        if len(header) < _ANSWER_HEADER.size:
+            return None
+        magic, version, file_max_product, lo, hi = _ANSWER_HEADER.unpack(header)
+        if magic != _ANSWER_MAGIC and magic not in _ANSWER_STALE_MAGICS:
+            return None
+        
+        stale = (magic != _ANSWER_MAGIC or version.rstrip(b"\0").decode() != ANSWER_TABLE_VERSION
+                 or file_max_product != max_product)
+        if not stale:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    if stale:
+        write_answer_table(path, lo, hi, max_product)
+        return open_answer_table(path, max_product)
+    
+    if len(mapping) != _ANSWER_HEADER.size + (hi - lo + 1) * _ANSWER_RECORD.size:
+        mapping.close()
+        return None
+    
+    _answer_tables[path] = (mapping, lo, hi)
+    return _answer_tables[path]
+
+def lookup_answer(path, target, max_product=800):
+    """
+    O(1) lookup of a precomputed answer
+    Returns: (result, spaces) like find_best_decomposition, or None if not stored
+    """
+    table = open_answer_table(path, max_product)
+    if table is None:
+        return None
+    
+    mapping, lo, hi = table
+    if not lo <= target <= hi:
+        return None
+    
+    offset = _ANSWER_HEADER.size + (target - lo) * _ANSWER_RECORD.size
+    spaces, outside_mult, outside_add, skip_plus_one, group_count, packed = _ANSWER_RECORD.unpack_from(mapping, offset)
+    if group_count == _ANSWER_MISSING:
+        return None
+    
+    main_groups = [RULES.unpack_group(group) for group in struct.unpack_from("<%dH" % group_count, packed)]
+    return (main_groups, outside_mult, outside_add, bool(skip_plus_one)), spaces
+
+# serve(): largest target each engine takes, a few seconds of search at most
+# (the DP table grows with the target, the residue and iterative layouts with
+# the spaces, and divisors() falls back to trial division past SIEVE_LIMIT)
+DAEMON_MAX_TARGETS = {"dp": 10 ** 7, "residue": 10 ** 9, "iterative": 10 ** 7}
+DAEMON_ENGINES = tuple(DAEMON_MAX_TARGETS)
+# SolverDaemon: methods each endpoint answers
+DAEMON_METHODS = {"/solve": ("GET", "POST"), "/batch": ("GET", "POST"), "/stats": ("GET",)}
+# Workers answer DP targets up to this from their growing Solver; past it
+# costing every quotient up front is slower than one pruned search
+DAEMON_SOLVER_LIMIT = 50000
+# SolverDaemon: largest request body read, in bytes
+DAEMON_MAX_BODY = 1 << 20
+
+# Warm Solver of a serve() worker process
+_daemon_solver = None
+
+def answer_payload(target, result, spaces):
+    """JSON-ready dict for one (result, spaces) answer"""
+    if result is None:
+        return {"target": target, "spaces": None, "spells": None}
+    main_groups, outside_mult, outside_add, skip_plus_one = result
+    return {
+        "target": target,
+        "spaces": spaces,
+        "spells": format_spell_ids(*result),
+        "groups": [[combo, overflow_count, bool(draw_cancel)] for combo, overflow_count, draw_cancel in main_groups],
+        "outside_mult": outside_mult,
+        "outside_add": outside_add,
+        "skip_plus_one": skip_plus_one,
+    }
+
+def _daemon_solve(target, engine):
+    """Worker side of SolverDaemon: one answer from the worker's warm Solver or a fresh search"""
+    global _daemon_solver
+    if engine == "dp" and target <= DAEMON_SOLVER_LIMIT:
+        if _daemon_solver is None:
+            _daemon_solver = Solver()
+        result, spaces = _daemon_solver.solve(target)
+    else:
+        result, spaces = find_best_decomposition(target, engine=engine)
+    return answer_payload(target, result, spaces)
+
+class SolverDaemon:
+    """
+    HTTP/JSON front end for serve(), on localhost TCP or a Unix socket.
+    
+    - GET /solve?target=N[&engine=E] or POST /solve {"target": N, "engine": E}
+    - POST /batch {"targets": [...], "engine": E} or a bare [...] list (or
+      GET /batch?targets=1,2,3)
+    - GET /stats
+    Other methods get 405, targets past DAEMON_MAX_TARGETS for their engine 400.
+    Answers are kept JSON-encoded per (target, engine), so a repeated target
+    is a dict lookup. Concurrent requests for a target that is being solved
+    wait for that one search instead of starting their own. Searches run in a
+    process pool forked from the warm parent (catalog loaded), each worker
+    keeping its own growing Solver, so the event loop never blocks.
+    """
+    
+    def __init__(self, workers=1):
+        load_products()
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            context = None
+        self.pool = ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=context)
+        self.cache = {}
+        self.inflight = {}
+        self.counters = {"requests": 0, "hits": 0, "coalesced": 0, "solved": 0}
+    
+    async def answer(self, target, engine="dp"):
+        """JSON-encoded answer for target, from the cache, a search in flight, or a new search"""
+        key = (target, engine)
+        encoded = self.cache.get(key)
+        if encoded is not None:
+            self.counters["hits"] += 1
+            return encoded
+        
+        future = self.inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.inflight[key] = future
+        try:
+            payload = await loop.run_in_executor(self.pool, _daemon_solve, target, engine)
+            encoded = json.dumps(payload).encode()
+            self.cache[key] = encoded
+            self.counters["solved"] += 1
+            future.set_result(encoded)
+            return encoded
+        except BaseException as error:
+            if not future.done():
+                future.set_exception(error)
+                future.exception()  # waiters re-raise it, don't warn when there are none
+            raise
+        finally:
+            del self.inflight[key]
+    
+    async def route(self, method, path, body):
+        """Returns: (HTTP status, JSON body bytes)"""
+        url = urlsplit(path)
+        if url.path in DAEMON_METHODS and method not in DAEMON_METHODS[url.path]:
+            allowed = ", ".join(DAEMON_METHODS[url.path])
+            return 405, json.dumps({"error": f"{url.path} takes {allowed}"}).encode()
+        
+        if body:
+            params = json.loads(body)
+            # A bare list is the targets of a batch
+            if isinstance(params, list) and url.path == "/batch":
+                params = {"targets": params}
+            if not isinstance(params, dict):
+                raise ValueError("request body must be a JSON object")
+        else:
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        engine = params.get("engine", "dp")
+        if engine not in DAEMON_ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(DAEMON_ENGINES)}")
+        
+        if url.path == "/solve":
+            return 200, await self.answer(_daemon_target(params.get("target"), engine), engine)
+        
+        if url.path == "/batch":
+            targets = params.get("targets", [])
+            if isinstance(targets, str):
+                targets = targets.split(",") if targets else []
+            targets = [_daemon_target(target, engine) for target in targets]
+            answers = await asyncio.gather(*(self.answer(target, engine) for target in targets))
+            return 200, b'{"results": [' + b", ".join(answers) + b"]}"
+        
+        if url.path == "/stats":
+            stats = dict(self.counters, cached=len(self.cache), inflight=len(self.inflight))
+            return 200, json.dumps(stats).encode()
+        
+        return 404, json.dumps({"error": f"no endpoint {url.path}"}).encode()
+    
+    async def handle(self, reader, writer):
+        """One client connection: HTTP/1.1 requests until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                
+                self.counters["requests"] += 1
+                length = headers.get("content-length", "0")
+                close = headers.get("connection", "").lower() == "close"
+                if not (length.isascii() and length.isdigit()) or int(length) > DAEMON_MAX_BODY:
+                    # Without a usable length the next request can't be found, so close
+                    status, payload = 400, json.dumps(
+                        {"error": f"Content-Length must be a number up to {DAEMON_MAX_BODY}"}).encode()
+                    close = True
+                else:
+                    body = await reader.readexactly(int(length))
+                    try:
+                        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                        status, payload = await self.route(method, path, body)
+                    except (ValueError, TypeError) as error:
+                        status, payload = 400, json.dumps({"error": str(error)}).encode()
+                
+                reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (status, reason.encode(), len(payload), payload))
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def _daemon_target(value, engine):
+    """Validate a requested target: a JSON integer, or decimal digits from a query string"""
+    if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        value = int(value)
+    # bool is an int too, but not a target
+    if type(value) is not int:
+        raise ValueError(f"target must be an integer, not {value!r}")
+    target = value
+    if target < 1:
+        raise ValueError("target must be at least 1")
+    if target > DAEMON_MAX_TARGETS[engine]:
+        raise ValueError(f"{engine} targets go up to {DAEMON_MAX_TARGETS[engine]}")
+    return target
+
+def serve(address, workers=1):
+    """
+    Run a SolverDaemon until interrupted. address is [HOST:]PORT (HOST
+    defaults to 127.0.0.1) or unix:PATH.
+    """
+    async def main():
+        daemon = SolverDaemon(workers)
+        if address.startswith("unix:"):
+            server = await asyncio.start_unix_server(daemon.handle, address[len("unix:"):])
+        else:
+            host, _, port = address.rpartition(":")
+            server = await asyncio.start_server(daemon.handle, host or "127.0.0.1", int(port))
+        print(f"Serving on {address}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            daemon.pool.shutdown(cancel_futures=True)
+    
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+# solve_batch(): targets sorted in memory at once, more are spilled to temporary runs
+BATCH_RUN_SIZE = 1 << 18
+# solve_batch(): upcoming targets looked at before growing the Solver, how many
+# times more a Solver cell costs than a pruned search per unit of target, and
+# the largest target the Solver grows to (about 30 bytes of memory per cell)
+BATCH_LOOKAHEAD = 4096
+BATCH_SEARCH_RATIO = 5
+BATCH_SOLVER_MAX = 1 << 21
+
+def read_targets(lines):
+    """
+    Targets from lines of text, one per line. Blank lines and # comments are
+    skipped, lines that aren't a positive integer are reported on stderr and
+    skipped.
+    """
+    for number, line in enumerate(lines, 1):
+        text = line.split("#", 1)[0].strip()
+        if not text:
+            continue
+        try:
+            target = int(text)
+        except ValueError:
+            target = 0
+        if not 1 <= target < 1 << 63:
+            print(f"line {number}: skipping {line.strip()!r}, not a positive integer", file=sys.stderr)
+            continue
+        yield target
+
+def _read_run(spill, block=4096):
+    """Targets of one spilled run, a block at a time"""
+    spill.seek(0)
+    while True:
+        values = array('q')
+        try:
+            values.fromfile(spill, block)
+        except EOFError:
+            yield from values
+            return
+        yield from values
+
+def sorted_unique_targets(targets, run_size=BATCH_RUN_SIZE):
+    """
+    targets in increasing order without repeats, holding at most two runs of
+    run_size targets in memory: each run is sorted and deduplicated, and if
+    there is more than one they go to temporary files and are merged back.
+    """
+    targets = iter(targets)
+    run = sorted(set(islice(targets, run_size)))
+    following = sorted(set(islice(targets, run_size)))
+    if not following:
+        yield from run
+        return
+    
+    runs = []
+    try:
+        while run:
+            spill = tempfile.TemporaryFile()
+            array('q', run).tofile(spill)
+            runs.append(spill)
+            run, following = following, sorted(set(islice(targets, run_size)))
+        
+        last = None
+        for target in heapq.merge(*(_read_run(spill) for spill in runs)):
+            if target != last:
+                yield target
+                last = target
+    finally:
+        for spill in runs:
+            spill.close()
+
+def solve_batch(targets, engine="dp", products=None):
+    """
+    Stream (target, result, spaces) for every distinct target, in increasing
+    order (see sorted_unique_targets()). Targets past DAEMON_MAX_TARGETS for
+    the engine are reported on stderr and skipped.
+    
+    The dp engine serves dense runs of targets up to BATCH_SOLVER_MAX from one
+    growing Solver (Solver.iter_answers()) that doesn't keep the answers, and
+    every other target with its own pruned search. Growing the Solver by a
+    cell costs about BATCH_SEARCH_RATIO times what a search costs per unit of
+    target, so a target beyond the Solver only grows it if that growth is
+    repaid by the searches it saves among the next BATCH_LOOKAHEAD targets.
+    Memory follows BATCH_SOLVER_MAX rather than the number or size of targets.
+    """
+    products = products if products is not None else load_products()
+    solver = Solver(products) if engine == "dp" else None
+    pending = deque()
+    answers = solver.iter_answers(_pending_targets(pending)) if solver is not None else None
+    
+    targets = sorted_unique_targets(targets)
+    while True:
+        chunk = list(islice(targets, BATCH_LOOKAHEAD))
+        if not chunk:
+            return
+        
+        # repays[i]: best (sum of chunk[i..j]) - BATCH_SEARCH_RATIO * chunk[j] over
+        # j >= i; growing the Solver from covered to chunk[j] pays off if
+        # that plus BATCH_SEARCH_RATIO * covered is at least 0
+        # (targets past BATCH_SOLVER_MAX, all at the end, never use the Solver)
+        repays = [0] * len(chunk)
+        best = None
+        total = 0
+        for i in range(len(chunk) - 1, -1, -1):
+            if chunk[i] > BATCH_SOLVER_MAX:
+                continue
+            value = -BATCH_SEARCH_RATIO * chunk[i] - total
+            total += chunk[i]
+            best = value if best is None or value > best else best
+            repays[i] = best + total
+        
+        for i, target in enumerate(chunk):
+            if target > DAEMON_MAX_TARGETS[engine]:
+                print(f"skipping {target}, {engine} targets go up to {DAEMON_MAX_TARGETS[engine]}", file=sys.stderr)
+                continue
+            if solver is not None and target <= BATCH_SOLVER_MAX:
+                covered = len(solver.base_cost) - 1
+                if target <= covered or repays[i] + BATCH_SEARCH_RATIO * covered >= 0:
+                    pending.append(target)
+                    yield next(answers)
+                    continue
+            result, spaces = find_best_decomposition(target, products=products, engine=engine)
+            yield target, result, spaces
+
+def _pending_targets(pending):
+    """Endless feed of Solver.iter_answers() from a deque that solve_batch() fills one target ahead"""
+    while True:
+        yield pending.popleft()
+
+def write_batch(answers, out, output_format="jsonl"):
+    """
+    Write (target, result, spaces) answers to out, one per line: answer_payload()
+    objects for jsonl, target,spaces,spells rows (with a header) for csv.
+    Returns: number of answers written
+    """
+    count = 0
+    if output_format == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(("target", "spaces", "spells"))
+        for target, result, spaces in answers:
+            writer.writerow((target, "" if result is None else spaces, "" if result is None else format_spell_ids(*result)))
+            count += 1
+    else:
+        for target, result, spaces in answers:
+            out.write(json.dumps(answer_payload(target, result, spaces)) + "\n")
+            count += 1
+    return count
+
 # Main program
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Find the fewest wand slots for a number of modifier copies")
+    parser.add_argument("--range", nargs=2, type=int, metavar=("LO", "HI"),
+                        help="print target, slots and spell IDs for every target LO..HI (tab-separated)")
+    parser.add_argument("--answers", metavar="PATH",
+                        help="precomputed answer table: written for --range, otherwise looked up before a dp search")
+    parser.add_argument("--engine", choices=("dp", "residue", "iterative"), default="dp",
+                        help="search engine; residue handles targets in the millions, iterative "
+                             "deepens over the slot count")
+    parser.add_argument("--cross-check", nargs=2, type=int, metavar=("LO", "HI"),
+                        help="compare the dp and iterative engines for every target LO..HI")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="search a single target with this many processes")
+    parser.add_argument("--top", type=int, metavar="K",
+                        help="also list the K cheapest alternative layouts for the target")
+    parser.add_argument("--reach", type=int, metavar="K",
+                        help="print how many targets a wand with K free slots can hit, and the largest")
+    parser.add_argument("--validate", nargs=2, type=int, metavar=("LO", "HI"),
+                        help="simulate the spell list of every target LO..HI (from --answers if given) "
+                             "and report the ones that don't yield the target")
+    parser.add_argument("--validate-file", metavar="PATH",
+                        help="simulate every spell list of a --range output file ('-' for stdin)")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="run a JSON solver daemon on [HOST:]PORT or unix:PATH (--workers processes)")
+    parser.add_argument("--batch", metavar="PATH",
+                        help="solve every target listed in PATH ('-' for stdin), one per line, in increasing "
+                             "order without repeats")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl",
+                        help="output format for --batch")
+    parser.add_argument("--profile", nargs="?", const="text", choices=("text", "json"),
+                        help="print the search's counters and phase timers to stderr, as text or JSON")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="print improving answers as they are found and stop searching after SECONDS")
+    args = parser.parse_args()
+    
+    # Optionally keep the product catalog on disk so later runs skip generation
+    load_products(cache_path=os.environ.get("DIVIDE_BY_CATALOG"))
+    
+    if args.serve:
+        serve(args.serve, args.workers)
+        sys.exit(0)
+    
+    if args.batch:
+        lines = sys.stdin if args.batch == "-" else open(args.batch)
+        with lines:
+            write_batch(solve_batch(read_targets(lines), args.engine), sys.stdout, args.format)
+        sys.exit(0)
+    
+    if args.validate or args.validate_file:
+        if args.validate_file:
+            rows = read_range_table(args.validate_file)
+        elif args.answers:
+            rows = ((target, answer[1], format_spell_ids(*answer[0])) if answer else (target, None, None)
+                    for target in range(args.validate[0], args.validate[1] + 1)
+                    for answer in [lookup_answer(args.answers, target)])
+        else:
+            rows = solve_range(*args.validate)
+        mismatches = 0
+        for target, spaces, spell_list, copies, slots, error in validate_spell_lists(rows):
+            mismatches += 1
+            problem = error or f"yields {copies} copies in {slots} slots"
+            print(f"{target}\t{spaces}\t{spell_list}\t{problem}")
+        print(f"{mismatches} mismatches")
+        sys.exit(1 if mismatches else 0)
+    
+    if args.range and args.answers:
+        write_answer_table(args.answers, *args.range)
+        sys.exit(0)
+    
+    if args.reach is not None:
+        index = ReachabilityIndex()
+        print(f"{len(index.reachable(args.reach))} targets reachable within {args.reach} slots, "
+              f"largest {index.max_reachable(args.reach)}")
+        sys.exit(0)
+    
+    if args.cross_check:
+        worse = 0
+        for target, dp_spaces, iterative_spaces in cross_check_engines(*args.cross_check):
+            print(f"{target}\tdp {dp_spaces}\titerative {iterative_spaces}")
+            worse += iterative_spaces > dp_spaces
+        print(f"{worse} targets where the iterative engine is worse")
+        sys.exit(1 if worse else 0)
+    
+    if args.range:
+        for target, spaces, spell_list in solve_range(*args.range):
+            sys.stdout.write(f"{target}\t{spaces}\t{spell_list}\n")
+        sys.exit(0)
+    
     target = int(input("Enter number of modifier copies desired: "))
     
-    result, spaces = find_best_decomposition(target)
+    if args.deadline is not None:
+        result, spaces, proven = find_best_decomposition_anytime(
+            target, deadline=args.deadline, engine=args.engine,
+            callback=lambda _, found: print(f"  ... {found} slots"))
+        print("  (proven optimal)" if proven else "  (deadline reached, may not be optimal)")
+    else:
+        stats = SolveStats() if args.profile else None
+        result, spaces = find_best_decomposition(target, answer_table=args.answers, engine=args.engine,
+                                                 workers=args.workers, stats=stats)
+        if args.profile == "json":
+            print(json.dumps(stats.as_dict()), file=sys.stderr)
+        elif args.profile:
+            print(f"Profile for {target}:\n{stats.format()}", file=sys.stderr)
     
     if result:
         main_groups, outside_mult, outside_add, skip_plus_one = result
@@ -439,10 +2103,16 @@ if __name__ == "__main__":
     else:
         print(f"Could not find a solution for {target} modifier copies")
     
-    # Test with examples
+    if args.top:
+        print(f"\n{args.top} cheapest layouts:")
+        for alternative, alternative_spaces in iter_decompositions(target, k=args.top):
+            print(f"  {alternative_spaces}: {format_spell_ids(*alternative)}")
+    
+    # Test with examples, sharing one growable solver
+    solver = Solver()
     print("\n" + "="*60)
     print("Test with 312 modifier copies:")
-    result, spaces = find_best_decomposition(312)
+    result, spaces = solver.solve(312)
     if result:
         main_groups, outside_mult, outside_add, skip_plus_one = result
         spell_list = format_spell_ids(main_groups, outside_mult, outside_add, skip_plus_one)
@@ -451,7 +2121,7 @@ if __name__ == "__main__":
     
     print("\n" + "="*60)
     print("Test with 517 modifier copies:")
-    result, spaces = find_best_decomposition(517)
+    result, spaces = solver.solve(517)
     if result:
         main_groups, outside_mult, outside_add, skip_plus_one = result
         spell_list = format_spell_ids(main_groups, outside_mult, outside_add, skip_plus_one)
@@ -460,7 +2130,7 @@ if __name__ == "__main__":
 
     print("\n" + "="*60)
     print("Test with 8 modifier copies:")
-    result, spaces = find_best_decomposition(8)
+    result, spaces = solver.solve(8)
     if result:
         main_groups, outside_mult, outside_add, skip_plus_one = result
         spell_list = format_spell_ids(main_groups, outside_mult, outside_add, skip_plus_one)
@@ -469,7 +2139,7 @@ if __name__ == "__main__":
     
     print("\n" + "="*60)
     print("Test with 5 modifier copies:")
-    result, spaces = find_best_decomposition(5)
+    result, spaces = solver.solve(5)
     if result:
         main_groups, outside_mult, outside_add, skip_plus_one = result
         spell_list = format_spell_ids(main_groups, outside_mult, outside_add, skip_plus_one)
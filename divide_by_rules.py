@@ -0,0 +1,786 @@
+import os
+import struct
+import time
+from array import array
+from itertools import product as cartesian
+from math import isqrt
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the pure Python DP is always available
+    np = None
+
+SYMBOLS = (10, 4, 3, 2)
+
+MAX_LENGTH = 4
+
+# Every sequence of 1..MAX_LENGTH symbols has one slot in a compiled table:
+# _OFFSETS[length] + encode_combo(combo), 4 + 16 + 64 + 256 = 340 slots
+_OFFSETS = (0, 0, 4, 20, 84, 340)
+
+# Compiled flag bits
+_VALID = 1
+_OVERFLOW = 2
+_DRAW_CANCEL = 4
+
+def encode_combo(combo):
+    """Pack a combo of up to 4 numbers from SYMBOLS into one byte (2 bits each)"""
+    code = 0
+    for position, num in enumerate(combo):
+        code |= SYMBOLS.index(num) << (2 * position)
+    return code
+
+def decode_combo(code, length):
+    """Inverse of encode_combo()"""
+    return [SYMBOLS[(code >> (2 * position)) & 3] for position in range(length)]
+
+def combo_index(combo):
+    """Slot of a combo in a compiled RuleSet table"""
+    return _OFFSETS[len(combo)] + encode_combo(combo)
+
+_spf_sieve = array('i', [0, 1])
+
+def smallest_prime_factors(limit):
+    """Smallest-prime-factor sieve covering 0..limit, grown and cached as needed"""
+    global _spf_sieve
+    if len(_spf_sieve) > limit:
+        return _spf_sieve
+    
+    size = max(limit + 1, 2 * len(_spf_sieve))
+    spf = array('i', range(size))
+    for i in range(2, isqrt(size - 1) + 1):
+        if spf[i] == i:
+            for j in range(i * i, size, i):
+                if spf[j] == j:
+                    spf[j] = i
+    
+    _spf_sieve = spf
+    return spf
+
+# Beyond this the sieve would cost more than trial division saves
+SIEVE_LIMIT = 1 << 18
+
+def smallest_prime_factor(n):
+    """Smallest prime factor of n >= 2, from the sieve or by trial division for huge n"""
+    if n <= SIEVE_LIMIT:
+        return smallest_prime_factors(n)[n]
+    for candidate in range(2, isqrt(n) + 1):
+        if n % candidate == 0:
+            return candidate
+    return n
+
+def divisors(n):
+    """All divisors of n >= 1 (unordered), from its smallest-prime-factor factorization"""
+    result = [1]
+    while n > 1:
+        prime = smallest_prime_factor(n)
+        exponent = 0
+        while n % prime == 0:
+            n //= prime
+            exponent += 1
+        result = [d * prime ** e for d in result for e in range(exponent + 1)]
+    return result
+
+# Catalog file: header (magic, rules version, max_product, entry count),
+# then one 4-byte record per combo in catalog order:
+# product (uint16), RuleSet.pack_group() of the entry (uint16)
+_CATALOG_MAGIC = b"DBPC"
+_CATALOG_HEADER = struct.Struct("<4s32sII")
+_CATALOG_RECORD = struct.Struct("<HH")
+
+# Default RuleSet.build_group_table() backend
+GROUP_TABLE_BACKEND = "numpy" if np is not None else "python"
+
+# _extend_group_table_numpy(): cells relaxed per block; shorter extensions
+# than NUMPY_MIN_CELLS run the Python loop, which is faster there
+NUMPY_BLOCK = 2048
+NUMPY_MIN_CELLS = 128
+
+# RuleSet.find_best_groups(): smallest target solved with a rolling window instead of a full table
+WINDOWED_GROUPS_THRESHOLD = 1 << 20
+
+class RuleSet:
+    """
+    The divide-by rules a script runs with, compiled once into a lookup table
+    over every sequence of up to MAX_LENGTH symbols.
+    
+    - caps: how many of each number multiply before it overflows to *1
+    - limits: most copies of each number a combo may hold at all
+    - draw_cancel: {position: numbers} that stop the cast at that position,
+      so only the numbers before it multiply (no overflow, no +1 or eye needed)
+    - overflow: {position: numbers} that overflow to *1 at that position,
+      so only the numbers before it multiply
+    Any other combo out of SYMBOLS order overflows too.
+    
+    Catalog entries are (combo, overflow_count, draw_cancel) if the rules
+    have draw cancel positions, (combo, overflow_count) otherwise.
+    version goes into cache files, bump it whenever the rules change.
+    
+    The catalog (load_products), the group-sum DP (build_group_table,
+    find_best_groups) and the outer search (calculate_spaces,
+    outside_candidates, find_best_decomposition) work on either entry shape,
+    so both scripts share them.
+    Methods taking stats add their time and counters to a SolveStats-like
+    object (add_time(), dp_cells, combos_examined, pairs_tried, pairs_rejected,
+    candidates_searched, improvements); dp_cells_evaluated counts every DP
+    cell filled under these rules (for benchmarks).
+    """
+    
+    def __init__(self, version, caps, limits, draw_cancel=None, overflow=None):
+        self.version = version
+        self.caps = dict(caps)
+        self.limits = dict(limits)
+        self.draw_cancel = dict(draw_cancel or {})
+        self.overflow = dict(overflow or {})
+        self.tracks_draw_cancel = bool(self.draw_cancel)
+        self.dp_cells_evaluated = 0
+        self._catalogs = {}
+        
+        self.products = array('I', [0]) * _OFFSETS[-1]
+        self.flags = bytearray(_OFFSETS[-1])
+        for length in range(1, MAX_LENGTH + 1):
+            for combo in cartesian(SYMBOLS, repeat=length):
+                index = combo_index(combo)
+                self.products[index], self.flags[index] = self._compile(list(combo))
+    
+    def _capped_product(self, combo):
+        product = 1
+        for num in SYMBOLS:
+            product *= num ** min(combo.count(num), self.caps[num])
+        return product
+    
+    def _compile(self, combo):
+        """Evaluate one combo the slow way. Returns: (product, flag bits)"""
+        bits = 0
+        if all(combo.count(num) <= self.limits[num] for num in SYMBOLS):
+            bits |= _VALID
+        
+        # Draw cancel: only the numbers before the first cancelling position multiply
+        for position in sorted(self.draw_cancel):
+            if position < len(combo) and combo[position] in self.draw_cancel[position]:
+                return self._capped_product(combo[:position]), bits | _DRAW_CANCEL
+        
+        # Standard overflow (too many of a number)
+        if any(combo.count(num) > self.caps[num] for num in SYMBOLS):
+            bits |= _OVERFLOW
+        
+        # Positional overflow: the number there (and after) multiplies by 1
+        effective = combo
+        for position in sorted(self.overflow):
+            if position < len(combo) and combo[position] in self.overflow[position]:
+                bits |= _OVERFLOW
+                effective = combo[:position]
+                break
+        
+        # Not in proper descending order also indicates overflow
+        if combo != sorted(combo, key=SYMBOLS.index):
+            bits |= _OVERFLOW
+        
+        return self._capped_product(effective), bits
+    
+    def evaluate(self, combo):
+        """
+        Product of a combo under these rules, by table lookup
+        Returns: (product, has_overflow, has_draw_cancel)
+        """
+        index = combo_index(combo)
+        bits = self.flags[index]
+        return self.products[index], bool(bits & _OVERFLOW), bool(bits & _DRAW_CANCEL)
+    
+    def evaluate_code(self, code, length):
+        """evaluate() for a combo given as encode_combo() code and length"""
+        index = _OFFSETS[length] + code
+        bits = self.flags[index]
+        return self.products[index], bool(bits & _OVERFLOW), bool(bits & _DRAW_CANCEL)
+    
+    def is_valid(self, combo):
+        """Check if a combo is valid (follows hierarchy or is valid overflow)"""
+        return len(combo) <= MAX_LENGTH and bool(self.flags[combo_index(combo)] & _VALID)
+    
+    def entry(self, combo):
+        """Catalog entry for a combo in this rule set's tuple shape"""
+        index = combo_index(combo)
+        bits = self.flags[index]
+        overflow_count = 1 if bits & _OVERFLOW else 0
+        if self.tracks_draw_cancel:
+            return combo, overflow_count, bool(bits & _DRAW_CANCEL)
+        return combo, overflow_count
+    
+    def pack_group(self, entry):
+        """
+        Pack a catalog entry into 16 bits:
+        combo code | (length | overflow << 3 | draw_cancel << 4) << 8
+        """
+        combo, overflow_count = entry[0], entry[1]
+        draw_cancel = entry[2] if self.tracks_draw_cancel else False
+        return encode_combo(combo) | (len(combo) | overflow_count << 3 | int(draw_cancel) << 4) << 8
+    
+    def unpack_group(self, packed):
+        """Inverse of pack_group(), in this rule set's tuple shape"""
+        info = packed >> 8
+        combo = decode_combo(packed & 255, info & 7)
+        if self.tracks_draw_cancel:
+            return combo, (info >> 3) & 1, bool(info & 16)
+        return combo, (info >> 3) & 1
+    
+    def generate_products(self, max_product=800):
+        """
+        Catalog of every product up to max_product: {product: [entry, ...]}
+        
+        Combos in descending order come first (by length, then largest number
+        first), then the out-of-order ones that end on a draw cancel position.
+        The order is the same on every run, which the searches rely on for
+        tie-breaking.
+        """
+        products = {}
+        seen = set()
+        
+        def add(combo, index):
+            if index not in seen:
+                seen.add(index)
+                products.setdefault(self.products[index], []).append(self.entry(combo))
+        
+        def descend(current, code, remaining):
+            if remaining == 0:
+                index = _OFFSETS[len(current)] + code
+                if self.products[index] <= max_product:
+                    add(current, index)
+                return
+            
+            # Numbers must be <= the last one to keep descending order
+            first = SYMBOLS.index(current[-1]) if current else 0
+            for symbol in range(first, len(SYMBOLS)):
+                new_code = code | symbol << (2 * len(current))
+                if self.flags[_OFFSETS[len(current) + 1] + new_code] & _VALID:
+                    descend(current + [SYMBOLS[symbol]], new_code, remaining - 1)
+        
+        for length in range(1, MAX_LENGTH + 1):
+            descend([], 0, length)
+        
+        # Out-of-order combos whose last number draw cancels
+        for position in sorted(self.draw_cancel):
+            for prefix in cartesian(SYMBOLS, repeat=position):
+                for last in self.draw_cancel[position]:
+                    combo = list(prefix) + [last]
+                    if combo == sorted(combo, reverse=True):
+                        continue  # Already generated in descending order
+                    
+                    index = combo_index(combo)
+                    bits = self.flags[index]
+                    if self.products[index] <= max_product and bits & _DRAW_CANCEL and bits & _VALID:
+                        add(combo, index)
+        
+        return products
+    
+    def load_products(self, max_product=800, cache_path=None, pruned=True, stats=None):
+        """
+        Return the product catalog for these rules, generating it only once.
+        
+        With pruned (the default) only the non-dominated combos per product are
+        kept, see prune_products(). Catalogs are memoized in-process per
+        (max_product, pruned). If cache_path is given the catalog is also read
+        from / written to that file, and a file built for other rules or another
+        max_product is rebuilt (the file always holds the full catalog).
+        The returned dict is shared, so callers must not modify it.
+        """
+        key = (max_product, pruned)
+        if key in self._catalogs:
+            return self._catalogs[key]
+        
+        products = None
+        if cache_path is not None and os.path.exists(cache_path):
+            products = self.read_products_file(cache_path, max_product)
+        
+        started = time.perf_counter() if stats is not None else None
+        if products is None:
+            products = self.generate_products(max_product)
+            if cache_path is not None:
+                self.write_products_file(cache_path, products, max_product)
+        
+        if pruned:
+            products = self.prune_products(products)
+        
+        if started is not None:
+            stats.add_time("catalog", time.perf_counter() - started)
+        self._catalogs[key] = products
+        return products
+    
+    def prune_products(self, products):
+        """
+        Keep only the non-dominated combos for each product.
+        
+        A combo is dominated if another combo for the same product is no longer
+        and has every flag it has (overflow and draw cancel only ever save
+        spaces), so it can never be part of a better answer. Survivors are
+        ranked by (length, overflow, draw_cancel), best first, which leaves
+        roughly one entry per distinct product for the DP to look at.
+        """
+        def rank(entry):
+            draw_cancel = entry[2] if self.tracks_draw_cancel else False
+            return len(entry[0]), -entry[1], -draw_cancel
+        
+        pruned = {}
+        for product, combo_list in products.items():
+            kept = []
+            for entry in sorted(combo_list, key=rank):
+                # Ranks negate the flags, so smaller is better in every component
+                length, overflow, draw_cancel = rank(entry)
+                dominated = any(
+                    other_length <= length and other_overflow <= overflow and other_draw_cancel <= draw_cancel
+                    for other_length, other_overflow, other_draw_cancel in map(rank, kept)
+                )
+                if not dominated:
+                    kept.append(entry)
+            pruned[product] = kept
+        return pruned
+    
+    def write_products_file(self, path, products, max_product):
+        """Persist a product catalog to a compact binary file"""
+        records = []
+        for product, combo_list in products.items():
+            for entry in combo_list:
+                records.append(_CATALOG_RECORD.pack(product, self.pack_group(entry)))
+        
+        header = _CATALOG_HEADER.pack(_CATALOG_MAGIC, self.version.encode(), max_product, len(records))
+        with open(path, "wb") as f:
+            f.write(header + b"".join(records))
+    
+    def read_products_file(self, path, max_product):
+        """
+        Load a catalog written by write_products_file()
+        Returns: products dict, or None if the file is invalid or built for other rules
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        
+        if len(data) < _CATALOG_HEADER.size:
+            return None
+        magic, version, file_max_product, count = _CATALOG_HEADER.unpack_from(data)
+        if magic != _CATALOG_MAGIC or version.rstrip(b"\0").decode() != self.version:
+            return None
+        if file_max_product != max_product or len(data) != _CATALOG_HEADER.size + count * _CATALOG_RECORD.size:
+            return None
+        
+        products = {}
+        for product, packed in _CATALOG_RECORD.iter_unpack(data[_CATALOG_HEADER.size:]):
+            products.setdefault(product, []).append(self.unpack_group(packed))
+        return products
+    
+    def build_group_table(self, max_target, products, backend=None, stats=None):
+        """
+        Build the group-sum DP table for every inner target from 0 up to max_target.
+        Every prefix of the table is identical whatever the final target is, so
+        one table can answer all inner targets of a search by lookup, and can be
+        grown later with extend_group_table().
+        
+        Each cell only stores backpointers in compact arrays; the group list is
+        rebuilt by walking them in reconstruct_groups().
+        Returns: (spaces, product, combo_index, flags) arrays indexed by inner target
+        (int32, uint16, uint8 and int8 per cell)
+        - spaces[i] = spaces for numbers, or -1 if i can't be reached
+        - product[i] / combo_index[i] = last group chosen, predecessor is i - product[i]
+        - flags[i] = bit 0 set if any group overflows, bit 1 if any group draw cancels
+        
+        backend is "python" or "numpy" (default GROUP_TABLE_BACKEND); both give
+        identical tables. The numpy backend still fills extensions of fewer than
+        NUMPY_MIN_CELLS cells with the Python loop.
+        """
+        table = (array('i', [0]), array('H', [0]), array('B', [0]), array('b', [0]))
+        return self.extend_group_table(table, max_target, products, backend, stats)
+    
+    def group_choices(self, products):
+        """
+        Only the first shortest combo of a product can ever win a DP cell, so the
+        catalog flattens to one (product, combo_index, length, flag bits) choice
+        per product, kept in catalog order to preserve tie-breaking
+        """
+        choices = []
+        for product, combo_list in products.items():
+            best_index = min(range(len(combo_list)), key=lambda index: len(combo_list[index][0]))
+            entry = combo_list[best_index]
+            draw_cancel = entry[2] if self.tracks_draw_cancel else False
+            bits = (1 if entry[1] > 0 else 0) | (2 if draw_cancel else 0)
+            choices.append((product, best_index, len(entry[0]), bits))
+        return choices
+    
+    def extend_group_table(self, table, max_target, products, backend=None, stats=None):
+        """
+        Fill the missing cells of a build_group_table() table up to max_target in
+        place, leaving the existing cells untouched. Returns the table.
+        """
+        dp_spaces, dp_product, dp_combo, dp_flags = table
+        start = len(dp_spaces)
+        size = max(max_target, 0) + 1
+        if size <= start:
+            return table
+        self.dp_cells_evaluated += size - start
+        
+        started = time.perf_counter() if stats is not None else None
+        choices = self.group_choices(products)
+        if (backend or GROUP_TABLE_BACKEND) == "numpy" and size - start >= NUMPY_MIN_CELLS:
+            _extend_group_table_numpy(table, start, size, choices)
+        else:
+            _extend_group_table_python(table, start, size, choices)
+        
+        if started is not None:
+            stats.add_time("dp", time.perf_counter() - started)
+            stats.dp_cells += size - start
+            stats.combos_examined += (size - start) * len(choices)
+        return table
+    
+    def _group_result(self, groups, spaces, flags):
+        """(groups, spaces, has_any_overflow[, has_any_draw_cancel]) in this rule set's shape"""
+        if self.tracks_draw_cancel:
+            return groups, spaces, bool(flags & 1), bool(flags & 2)
+        return groups, spaces, bool(flags & 1)
+    
+    def reconstruct_groups(self, table, target, products):
+        """
+        Walk the backpointers of a build_group_table() table from target down to 0
+        Returns: (groups, total_spaces_for_numbers, has_any_overflow, has_any_draw_cancel) or None,
+        without has_any_draw_cancel if the rules have no draw cancel positions
+        """
+        dp_spaces, dp_product, dp_combo, dp_flags = table
+        if dp_spaces[target] < 0:
+            return None
+        
+        groups = []
+        i = target
+        while i > 0:
+            product = dp_product[i]
+            groups.append(products[product][dp_combo[i]])
+            i -= product
+        groups.reverse()
+        
+        return self._group_result(groups, dp_spaces[target], dp_flags[target])
+    
+    def find_best_groups(self, target, products, table=None, stats=None):
+        """
+        Find the best way to sum to target using products
+        Returns: reconstruct_groups() tuple or None
+        
+        If a table from build_group_table() already covers target, the answer is
+        looked up instead of running the DP again. Without one, targets of
+        WINDOWED_GROUPS_THRESHOLD and up use find_best_groups_windowed().
+        """
+        if target == 0:
+            return self._group_result([], 0, 0)
+        
+        if target < 0:
+            return None
+        
+        if table is None and target >= WINDOWED_GROUPS_THRESHOLD:
+            return self.find_best_groups_windowed(target, products, stats=stats)
+        
+        if table is None or target >= len(table[0]):
+            table = self.build_group_table(target, products, stats=stats)
+        
+        return self.reconstruct_groups(table, target, products)
+    
+    def find_best_groups_windowed(self, target, products, interval=None, stats=None):
+        """
+        find_best_groups() without a table as long as target.
+        
+        No cell looks back further than the largest product, so the forward pass
+        only keeps that many cells (the window), re-based so its first cell is
+        index 0, and extends it with extend_group_table() a segment of interval
+        cells at a time. The window at the start of every segment is kept as a
+        checkpoint. The groups are then rebuilt from the last segment back,
+        recomputing each segment from its checkpoint to walk its backpointers.
+        
+        Every cell is computed at most twice, and memory is the checkpoints plus
+        one segment: about sqrt(target * largest product) cells with the default
+        interval, instead of target cells. Same answer as the full table.
+        Returns: reconstruct_groups() tuple or None
+        """
+        if target == 0:
+            return self._group_result([], 0, 0)
+        
+        if target < 0:
+            return None
+        
+        width = max(products) + 1
+        if interval is None:
+            interval = isqrt(target * width)
+        interval = max(interval, width)
+        
+        # Forward pass: checkpoints[k] = (absolute index of its first cell, window)
+        # for the segment starting at k * interval
+        checkpoints = []
+        table = self.build_group_table(0, products)
+        base = 0
+        for start in range(0, target, interval):
+            cells = min(width, start - base + 1)
+            window = _table_tail(table, cells)
+            base = start - cells + 1
+            checkpoints.append((base, window))
+            table = tuple(array(column.typecode, column) for column in window)
+            self.extend_group_table(table, min(start + interval, target) - base, products, stats=stats)
+        
+        dp_spaces, _, _, dp_flags = table
+        if dp_spaces[target - base] < 0:
+            return None
+        total_spaces = dp_spaces[target - base]
+        flags = dp_flags[target - base]
+        
+        # Backward pass: the last segment is still in table, earlier ones are
+        # recomputed up to where the walk enters them
+        groups = []
+        i = target
+        for segment in range(len(checkpoints) - 1, -1, -1):
+            start = segment * interval
+            if i <= start:
+                continue
+            if segment < len(checkpoints) - 1:
+                base, window = checkpoints[segment]
+                table = tuple(array(column.typecode, column) for column in window)
+                self.extend_group_table(table, i - base, products, stats=stats)
+            _, dp_product, dp_combo, _ = table
+            while i > start:
+                product = dp_product[i - base]
+                groups.append(products[product][dp_combo[i - base]])
+                i -= product
+        groups.reverse()
+        
+        return self._group_result(groups, total_spaces, flags)
+
+    def calculate_spaces(self, main_groups, outside_multiplier, outside_addition, skip_plus_one):
+        """
+        Calculate total spaces used:
+        - Each number from set = 1 space
+        - Each (trigger) between groups = 1 space
+        - +1 at end = 1 space (just the +) - unless skipped due to overflow or draw cancel
+        - Outside multiplier = its value in spaces
+        - (eye) = 1 space (if iteration canceling wasn't used AND no draw cancel)
+        - Outside addition = its value in spaces
+        """
+        spaces = 0
+        
+        # Count numbers in groups
+        for entry in main_groups:
+            spaces += len(entry[0])
+        
+        # Count (trigger)s between groups
+        if len(main_groups) > 1:
+            spaces += len(main_groups) - 1
+        
+        # Add cost of +1 if not skipped (just the + sign)
+        if not skip_plus_one:
+            spaces += 1
+        
+        # Outside multiplier
+        spaces += outside_multiplier
+        
+        # (eye) space (if iteration canceling wasn't used AND no draw cancel)
+        # Draw cancel eliminates the need for ADD_TRIGGER + BLOOD_MAGIC
+        has_draw_cancel = self.tracks_draw_cancel and any(entry[2] for entry in main_groups)
+        if not skip_plus_one and not has_draw_cancel:
+            spaces += 1
+        
+        # Outside addition
+        spaces += outside_addition
+        
+        return spaces
+    
+    def outside_candidates(self, target, limit=1000, stats=None):
+        """
+        (outside_mult, outside_add) pairs with both below limit and outside_mult
+        dividing target - outside_add, sorted like the original nested loops.
+        Only real divisors of each base are listed.
+        """
+        started = time.perf_counter() if stats is not None else None
+        candidates = []
+        for outside_add in range(0, min(target, limit)):
+            for outside_mult in divisors(target - outside_add):
+                if outside_mult < limit:
+                    candidates.append((outside_mult, outside_add))
+        candidates.sort()
+        
+        if started is not None:
+            stats.add_time("candidates", time.perf_counter() - started)
+            # The original nested loops walked the whole grid
+            grid = (min(target + 1, limit) - 1) * min(target, limit)
+            stats.pairs_tried += len(candidates)
+            stats.pairs_rejected += grid - len(candidates)
+        return candidates
+    
+    def candidate_layouts(self, quotient, products, inner_groups, stats=None):
+        """
+        Inner layouts for one quotient in the search's case order:
+        Case 1 single overflow/draw cancel groups, then the Case 2 +1 decomposition.
+        inner_groups(inner_target) answers the group sums (find_best_groups-style).
+        Yields: (main_groups, skip_plus_one)
+        """
+        # Case 1: Single group with overflow or draw cancel (no +1 needed)
+        combo_list = products.get(quotient, ())
+        if stats is not None:
+            stats.combos_examined += len(combo_list)
+        for entry in combo_list:
+            if entry[1] > 0 or (self.tracks_draw_cancel and entry[2]):
+                yield [entry], True
+        
+        # Case 2: Normal decomposition with +1
+        inner_target = quotient - 1
+        if inner_target >= 0:
+            result = inner_groups(inner_target)
+            if result is not None:
+                yield result[0], False
+    
+    def find_best_decomposition(self, target, products, shared_table=True, candidates=None, stats=None):
+        """
+        Find the best decomposition optimizing for minimum spaces, trying every
+        outside_candidates() pair (or the given candidates) in order, so ties go
+        to the smallest (outside_mult, outside_add).
+        
+        With shared_table (the default) the group-sum DP is filled once up to the
+        largest inner target (target - 1) and every (outside_mult, outside_add)
+        pair is answered by lookup. shared_table=False runs a separate DP per pair.
+        Returns: ((main_groups, outside_mult, outside_add, skip_plus_one), spaces)
+        or (None, (None, None))
+        """
+        if candidates is None:
+            candidates = self.outside_candidates(target, stats=stats)
+        started = time.perf_counter() if stats is not None else None
+        table = self.build_group_table(target - 1, products, stats=stats) if shared_table else None
+        
+        def inner_groups(inner_target):
+            return self.find_best_groups(inner_target, products, table, stats)
+        
+        best_result = None
+        best_spaces = float('inf')
+        improvements = 0
+        
+        for outside_mult, outside_add in candidates:
+            quotient = (target - outside_add) // outside_mult
+            for main_groups, skip_plus_one in self.candidate_layouts(quotient, products, inner_groups, stats):
+                spaces = self.calculate_spaces(main_groups, outside_mult, outside_add, skip_plus_one)
+                
+                if spaces < best_spaces:
+                    best_spaces = spaces
+                    best_result = (main_groups, outside_mult, outside_add, skip_plus_one)
+                    improvements += 1
+        
+        if started is not None:
+            stats.add_time("search", time.perf_counter() - started)
+            stats.candidates_searched += len(candidates)
+            stats.improvements += improvements
+        return best_result, best_spaces if best_result else (None, None)
+
+def _table_tail(table, cells):
+    """Copy of the last cells of a build_group_table() table"""
+    return tuple(column[len(column) - cells:] for column in table)
+
+def _extend_group_table_python(table, start, size, choices):
+    """RuleSet.extend_group_table() for cells start..size-1, one cell at a time"""
+    dp_spaces, dp_product, dp_combo, dp_flags = table
+    for i in range(start, size):
+        best_spaces = -1
+        best_product = 0
+        best_combo = 0
+        best_flags = 0
+        
+        for product, index, length, bits in choices:
+            if product > i:
+                continue
+            
+            prev_spaces = dp_spaces[i - product]
+            if prev_spaces < 0:
+                continue
+            
+            new_spaces = prev_spaces + length
+            if best_spaces < 0 or new_spaces < best_spaces:
+                best_spaces = new_spaces
+                best_product = product
+                best_combo = index
+                best_flags = dp_flags[i - product] | bits
+        
+        dp_spaces.append(best_spaces)
+        dp_product.append(best_product)
+        dp_combo.append(best_combo)
+        dp_flags.append(best_flags)
+
+def _extend_group_table_numpy(table, start, size, choices):
+    """
+    Vectorized RuleSet.extend_group_table() for cells start..size-1, NUMPY_BLOCK cells
+    at a time. Each block only reads the largest product's worth of cells
+    before it, so a pass never touches the rest of the table.
+    
+    Within a block: min-plus relaxation over shifted slices until the spaces
+    stop changing, then one strict-improvement pass in catalog order for the
+    backpointers so ties go the same way as the Python loop.
+    """
+    dp_spaces, dp_product, dp_combo, dp_flags = table
+    unreachable = np.int64(1) << 40
+    width = max(product for product, _, _, _ in choices)
+    chosen_products = np.array([c[0] for c in choices], dtype=np.int64)
+    chosen_combos = np.array([c[1] for c in choices], dtype=np.int64)
+    chosen_bits = np.array([c[3] for c in choices], dtype=np.int8)
+    
+    for block_start in range(start, size, NUMPY_BLOCK):
+        block_end = min(block_start + NUMPY_BLOCK, size)
+        lo = max(0, block_start - width)
+        block = block_end - block_start
+        
+        # Cells lo..block_end-1, the block after its context
+        spaces = np.full(block_end - lo, unreachable, dtype=np.int64)
+        spaces[:block_start - lo] = np.frombuffer(dp_spaces, dtype=np.int32, count=block_start - lo, offset=4 * lo)
+        spaces[:block_start - lo][spaces[:block_start - lo] < 0] = unreachable
+        
+        # Each round adds one more group to every chain, so this runs about as
+        # many rounds as the longest chain inside the block
+        new = spaces[block_start - lo:]
+        while True:
+            previous = new.copy()
+            for product, _, length, _ in choices:
+                first = max(block_start, product)
+                if first < block_end:
+                    np.minimum(spaces[first - lo:], spaces[first - lo - product:block_end - lo - product] + length,
+                               out=spaces[first - lo:])
+            if np.array_equal(previous, new):
+                break
+        
+        best = np.full(block, unreachable, dtype=np.int64)
+        choice = np.zeros(block, dtype=np.int64)
+        for j, (product, _, length, _) in enumerate(choices):
+            first = max(block_start, product)
+            if first < block_end:
+                candidate = spaces[first - lo - product:block_end - lo - product] + length
+                better = candidate < best[first - block_start:]
+                best[first - block_start:][better] = candidate[better]
+                choice[first - block_start:][better] = j
+        
+        reachable = new < unreachable
+        product = chosen_products[choice]
+        combo = chosen_combos[choice]
+        bits = chosen_bits[choice]
+        product[~reachable] = 0
+        combo[~reachable] = 0
+        bits[~reachable] = 0
+        
+        # Flags OR along the backpointer chain; propagate until stable (an
+        # unreachable cell points at itself with no bits, so it stays 0)
+        flags = np.zeros(block_end - lo, dtype=np.int8)
+        flags[:block_start - lo] = np.frombuffer(dp_flags, dtype=np.int8, count=block_start - lo, offset=lo)
+        sources = np.arange(block_start, block_end) - product - lo
+        while True:
+            updated = bits | flags[sources]
+            if np.array_equal(updated, flags[block_start - lo:]):
+                break
+            flags[block_start - lo:] = updated
+        
+        new[~reachable] = -1
+        dp_spaces.frombytes(new.astype(np.int32).tobytes())
+        dp_product.frombytes(product.astype(np.uint16).tobytes())
+        dp_combo.frombytes(combo.astype(np.uint8).tobytes())
+        dp_flags.frombytes(flags[block_start - lo:].tobytes())
+
+# Caps and limits shared by both variants: first 2 tens, 3 fours, 3 threes and
+# 4 twos multiply; max 2 normal + 1 overflow ten, 4 of anything else
+_CAPS = {10: 2, 4: 3, 3: 3, 2: 4}
+_LIMITS = {10: 3, 4: 4, 3: 4, 2: 4}
+
+# divide-by-noita-way.py: 10 in the 3rd position or 10/4/3 in the 4th draw cancels
+NOITA_RULES = RuleSet("noita-way-1", _CAPS, _LIMITS, draw_cancel={2: (10,), 3: (10, 4, 3)})
+
+# divide-by-min-spaces-with-div1.py: 10/4/3 in the 4th position overflows to *1
+DIV1_RULES = RuleSet("min-spaces-div1-1", _CAPS, _LIMITS, overflow={3: (10, 4, 3)})